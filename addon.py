@@ -3,8 +3,13 @@
 Entry point of the plugin.
 """
 import sys
+import urllib.parse
 import routes
 from constants import PLUGIN
+from stats import STATS
 
 if __name__ == '__main__':
-    sys.exit(PLUGIN.run())
+    with STATS.timer('invocation'):
+        result = PLUGIN.run()
+    STATS.flush(urllib.parse.urlsplit(sys.argv[0]).path or '/')
+    sys.exit(result)
@@ -3,60 +3,91 @@
 Unofficial API to https://amvnews.ru.
 """
 import datetime
-import urllib.parse
+import functools
 import os
-import re
 import requests
-from xml.etree import ElementTree as etree
-from bs4 import BeautifulSoup
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from constants import PLUGIN
-from helpers import Singleton, Language
-import xbmc
-import xbmcvfs
+from helpers import Singleton
+from httpcache import HttpCache
+from httpclient import HttpClient
+from metadata import migrate_legacy_dict
+from ratelimit import RateLimiter
+from search import SearchIndex
+from parsers import DETAIL_PAGE_FILTER, RATESTOP_FILTER, parse_html, parse_featured_summaries, parse_amv_ids, \
+    parse_amv_page
+from stats import STATS
+from storage import MetadataStore, TaskQueue, SyncStore, CrawlState, TASK_REFRESH_AMV, TASK_PREFETCH_PAGE, \
+    PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_BACKGROUND
+from urls import get_homepage
 
 __all__ = ['AmvNewsBrowser']
 
 
-class AmvNewsBrowser(object):
+def _authenticated(method):
     """
-    Web browser to access AmvNews site.
+    Decorator which authenticates the browser on the site before the first call of a method that requires it.
+
+    :param callable method: Method of AmvNewsBrowser.
+    :return: Wrapped method.
+    :rtype: callable
     """
+    @functools.wraps(method)
+    def wrapper(self, *args, **kwargs):
+        if not self.authenticated:
+            self._login()
+        return method(self, *args, **kwargs)
+    return wrapper
 
-    __metaclass__ = Singleton
 
-    # AmvNews homepage
-    homepage = 'https://amvnews.ru/index.php'
+def _is_missing_amv_error(error):
+    """
+    Check whether metadata of AMV can't be obtained because AMV doesn't exist (e.g. it has been deleted).
 
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.headers.update({'User-Agent': 'AppleWebKit/537.36 (KHTML, like Gecko)'})
-        self.session.post(self.homepage, params={'go': 'Members'}, data={
-            'user_name': PLUGIN.get_setting('username'),
-            'user_password': PLUGIN.get_setting('password'),
-            'login': '%C2%EE%E9%F2%E8...'
-        })
+    Page of missing AMV either can't be found or has no metadata.
 
-    @classmethod
-    def get_amv_url(cls, amv_id):
-        """
-        Get URL to AMV file.
+    :param Exception error: Error of obtaining of AMV metadata.
+    :rtype: bool
+    """
+    if isinstance(error, requests.HTTPError):
+        return error.response is not None and error.response.status_code == 404
+    return not isinstance(error, requests.RequestException)
 
-        :param int amv_id: Identifier of AMV
-        :return: URL to AMV file.
-        :rtype str
-        """
-        return cls._get_full_url({'go': 'Files', 'file': 'down', 'id': amv_id})
 
-    @classmethod
-    def get_subtitles_url(cls, subtitles_id):
-        """
-        Get URL to subtitles file.
+class AmvNewsBrowser(object):
+    """
+    Web browser to access AmvNews site.
+    """
 
-        :param int subtitles_id: Identifier of subtitles
-        :return: URL to subtitles file.
-        :rtype str
-        """
-        return cls._get_full_url({'go': 'Files', 'file': 'down', 'sub': subtitles_id})
+    __metaclass__ = Singleton
+
+    def __init__(self):
+        self.max_workers = max(1, PLUGIN.get_setting('max_workers', int))
+        # Pool is shared by workers fetching pages and by workers downloading files
+        pool_size = max(PLUGIN.get_setting('http_pool_size', int), self.max_workers,
+                        PLUGIN.get_setting('download_workers', int))
+        self.http = HttpClient(
+            pool_size, PLUGIN.get_setting('http_connect_timeout', int), PLUGIN.get_setting('http_read_timeout', int),
+            PLUGIN.get_setting('http_retries', int),
+            RateLimiter(os.path.join(PLUGIN.storage_path, 'ratelimit.lock'), PLUGIN.get_setting('rate_limit', int)))
+        self.session = self.http.session
+        self._login_lock = threading.Lock()
+        self._login_generation = 0
+        self.authenticated = self._restore_session()
+        self.http_cache = HttpCache(
+            os.path.join(PLUGIN.storage_path, 'http_cache.db'),
+            PLUGIN.get_setting('http_cache_size', int) * 1024 * 1024)
+        self.metadata_store = MetadataStore(
+            os.path.join(PLUGIN.storage_path, 'metadata.db'),
+            PLUGIN.get_setting('metadata_cache_rows', int),
+            PLUGIN.get_setting('metadata_cache_size', int) * 1024 * 1024)
+        self.metadata_ttl = datetime.timedelta(days=PLUGIN.get_setting('metadata_ttl', int))
+        self.search_index = SearchIndex(os.path.join(PLUGIN.storage_path, 'search.db'))
+        self.task_queue = TaskQueue(os.path.join(PLUGIN.storage_path, 'tasks.db'))
+        self.sync_store = SyncStore(os.path.join(PLUGIN.storage_path, 'sync.db'))
+        self.crawl_state = CrawlState(os.path.join(PLUGIN.storage_path, 'crawl.db'))
 
     def get_featured_amv_list(self, page):
         """
@@ -65,22 +96,32 @@ class AmvNewsBrowser(object):
         To avoid heavy queries featured AMV are obtained by small portions (pages). Data for each page is
         obtained independently by demand.
 
+        Only the page with the list of news is downloaded. AMV which full metadata isn't cached are described by
+        summary metadata taken from the news, full metadata for them is queued to be obtained by the background
+        service. Date of the news is assigned to AMV described by full metadata too.
+
         :param int page: Page number.
         :return: List of featured AMV metadata.
-        :rtype: dict
+        :rtype: list[AmvInfo|AmvSummary]
         """
-        html = self._get_html_page({'go': 'News', 'page': (page - 1) * 10, 'in': 'cat', 'id': 1})
+        summaries = self._get_listing_page('featured', page)
+        cached_metadata = self._get_cached_amv_list([summary.id for summary in summaries])
 
         result = []
-        for node in html.find_all('span', attrs={'class': 'newstitle'}):
-            amv_link = node.find_parent('table').find_next_sibling('table').find(
-                'a', attrs={'class': 'more-news-simple-a'}
-            ).attrs['href']
-            metadata = self.get_amv(int(REGEX_AMV_ID.match(amv_link).groupdict()['id']))
-            metadata['amv'].update({'date': node.find_parent('td').find_next_sibling('td').text.strip()})
-            result.append(metadata)
+        for summary in summaries:
+            metadata = cached_metadata.get(summary.id)
+            if metadata is None:
+                result.append(summary)
+            else:
+                metadata.date = summary.date
+                result.append(metadata)
+
+        self.task_queue.put(
+            TASK_REFRESH_AMV, [summary.id for summary in summaries if summary.id not in cached_metadata],
+            PRIORITY_INTERACTIVE)
         return result
 
+    @_authenticated
     def get_evaluated_amv_list(self, page):
         """
         Get information about evaluated AMV.
@@ -90,15 +131,11 @@ class AmvNewsBrowser(object):
 
         :param int page: Page number.
         :return: List of evaluated AMV metadata.
-        :rtype: list[dict]
+        :rtype: list[AmvInfo]
         """
-        html = self._get_html_page({'go': 'Files', 'page': (page - 1) * 10, 'file': 'votes'})
-
-        result = []
-        for node in html.find_all('a', attrs={'class': 'ratestop'})[:10]:
-            result.append(self.get_amv(int(REGEX_AMV_ID.match(node.attrs['href']).groupdict()['id'])))
-        return result
+        return self.get_amv_list(self._get_listing_page('evaluated', page))
 
+    @_authenticated
     def get_favourite_amv_list(self, page):
         """
         Get information about favourite AMV.
@@ -108,61 +145,235 @@ class AmvNewsBrowser(object):
 
         :param int page: Page number.
         :return: List of favourite AMV metadata.
-        :rtype: list[dict]
+        :rtype: list[AmvInfo]
         """
-        html = self._get_html_page({'go': 'Files', 'page': (page - 1) * 10, 'file': 'favor'})
+        return self.get_amv_list(self._get_listing_page('favourite', page))
 
-        result = []
-        for node in html.find_all('a', attrs={'class': 'ratestop'})[:10]:
-            result.append(self.get_amv(int(REGEX_AMV_ID.match(node.attrs['href']).groupdict()['id'])))
+    @_authenticated
+    def iter_amv_id_pages(self, listing):
+        """
+        Iterate over all pages of evaluated or favourite AMV.
+
+        Pages are obtained lazily, so every page may be processed before the next one is downloaded. Iteration stops
+        at the first page without AMV identifiers.
+
+        :param str listing: Name of listing ('evaluated' or 'favourite').
+        :return: Generator of lists of AMV identifiers.
+        :rtype: collections.Iterator[list[int]]
+        """
+        page = 1
+        while True:
+            amv_ids = self._get_listing_page(listing, page)
+            if not amv_ids:
+                return
+            yield amv_ids
+            page += 1
+
+    def iter_amv_pages(self, listing):
+        """
+        Iterate over all pages of evaluated or favourite AMV.
+
+        Pages which metadata can't be obtained are yielded empty.
+
+        :param str listing: Name of listing ('evaluated' or 'favourite').
+        :return: Generator of lists of AMV metadata.
+        :rtype: collections.Iterator[list[AmvInfo]]
+        """
+        for amv_ids in self.iter_amv_id_pages(listing):
+            yield self.get_amv_list(amv_ids)
+
+    def get_listing_scope(self, listing):
+        """
+        Get key which distinguishes listing of the current user from the same listing of other users.
+
+        :param str listing: Name of listing ('featured', 'evaluated' or 'favourite').
+        :return: Key of the listing.
+        :rtype: str
+        """
+        return '{}:{}'.format(listing, PLUGIN.get_setting('username') if listing != 'featured' else '')
+
+    def schedule_prefetch(self, listing, page):
+        """
+        Queue listing page to be prefetched by the background service.
+
+        Prefetching of pages queued before is cancelled because the user has already left them.
+
+        :param str listing: Name of listing ('featured', 'evaluated' or 'favourite').
+        :param int page: Page number.
+        """
+        if PLUGIN.get_setting('prefetch', bool):
+            self.task_queue.cancel(TASK_PREFETCH_PAGE)
+            self.task_queue.put(TASK_PREFETCH_PAGE, ['{}:{}'.format(listing, page)], PRIORITY_PREFETCH)
+
+    def prefetch(self, listing, page, is_cancelled):
+        """
+        Put listing page and metadata of its AMV to the cache.
+
+        Metadata is obtained by portions of `max_workers` AMV, prefetching stops between portions once it is
+        cancelled.
+
+        :param str listing: Name of listing ('featured', 'evaluated' or 'favourite').
+        :param int page: Page number.
+        :param callable is_cancelled: Function which tells whether prefetching is cancelled.
+        """
+        if listing != 'featured' and not self.authenticated:
+            self._login()
+
+        entries = self._get_listing_page(listing, page)
+        amv_ids = [summary.id for summary in entries] if listing == 'featured' else entries
+        cached_metadata = self._get_cached_amv_list(amv_ids)
+        missed_ids = [amv_id for amv_id in amv_ids if amv_id not in cached_metadata]
+        for i in range(0, len(missed_ids), self.max_workers):
+            if is_cancelled():
+                break
+            self.fetch_amv_list(missed_ids[i:i + self.max_workers])
+
+    def get_amv_list(self, amv_ids):
+        """
+        Get information about several AMV at once.
+
+        Metadata which is absent in the cache is obtained concurrently by a bounded pool of workers. AMV which
+        metadata can't be obtained are skipped, so partial result is returned instead of an error. Outdated
+        metadata is returned as is and queued to be refreshed by the background service.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: List of AMV metadata in the same order as identifiers.
+        :rtype: list[AmvInfo]
+        """
+        result = self._get_cached_amv_list(amv_ids)
+
+        missed_ids = [amv_id for amv_id in set(amv_ids) if amv_id not in result]
+        if missed_ids:
+            result.update(self.fetch_amv_list(missed_ids))
+
+        return [result[amv_id] for amv_id in amv_ids if amv_id in result]
+
+    def fetch_amv_list(self, amv_ids):
+        """
+        Download information about several AMV regardless of the cache and put it to the cache.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: Metadata of AMV which has been obtained by their identifiers.
+        :rtype: dict[int, AmvInfo]
+        """
+        result, errors = self._fetch_amv_list(amv_ids)
+        for amv_id, e in errors.items():
+            PLUGIN.log.warning('Failed to get metadata of AMV %d: %s', amv_id, e)
         return result
 
+    def crawl_catalog(self):
+        """
+        Put metadata of the next portion of AMV of the site to the cache and to the search index.
+
+        Identifiers of AMV are walked upwards from the place where the previous portion has stopped by portions of
+        `max_workers` AMV, cached AMV are skipped. A single portion is crawled per call, so the caller can execute
+        other tasks between portions. Crawling ends once `CRAWL_END_MARGIN` identifiers in a row beyond the newest
+        known AMV turn out to be missing. Then metadata which has expired is refreshed by portions, metadata of AMV
+        which have been deleted from the site is removed, and the next crawling starts right after the newest AMV in
+        `CRAWL_INTERVAL`. Network errors postpone crawling for `CRAWL_RETRY_DELAY` keeping its progress. The newest
+        AMV is taken from the latest news once crawling is resumed after it has been postponed.
+        """
+        next_id, newest_id, postponed_until = self.crawl_state.get()
+        if postponed_until or not newest_id:
+            try:
+                # AMV of the latest news may be newer than AMV found by the previous crawling
+                newest_id = max([newest_id] + [summary.id for summary in self._get_listing_page('featured', 1)])
+            except requests.RequestException as e:
+                PLUGIN.log.warning('Failed to crawl the catalog: %s', e)
+                self.crawl_state.put(next_id, newest_id, time.time() + CRAWL_RETRY_DELAY)
+                return
+
+        if next_id > newest_id + CRAWL_END_MARGIN:
+            # All AMV are walked, metadata which has expired is refreshed before the next crawling
+            missed_ids = self.metadata_store.get_expired_ids(
+                time.time() - self.metadata_ttl.total_seconds(), self.max_workers)
+            if not missed_ids:
+                PLUGIN.log.info('Catalog is crawled up to AMV %d', newest_id)
+                self.crawl_state.put(newest_id + 1, newest_id, time.time() + CRAWL_INTERVAL)
+                return
+            walked_ids = []
+        else:
+            walked_ids = list(range(next_id, next_id + self.max_workers))
+            stored_ids = self.metadata_store.get_stored_ids(walked_ids)
+            missed_ids = [amv_id for amv_id in walked_ids if amv_id not in stored_ids]
+
+        result, errors = self._fetch_amv_list(missed_ids)
+        network_errors = [e for e in errors.values() if not _is_missing_amv_error(e)]
+        if network_errors:
+            PLUGIN.log.warning('Failed to crawl the catalog: %s', network_errors[0])
+            self.crawl_state.put(next_id, newest_id, time.time() + CRAWL_RETRY_DELAY)
+            return
+
+        # Metadata of deleted AMV would be refreshed again and again
+        self.metadata_store.delete_many(list(errors))
+        found_ids = [amv_id for amv_id in walked_ids if amv_id not in errors]
+        self.crawl_state.put(next_id + len(walked_ids), max([newest_id] + found_ids))
+
     def get_amv(self, amv_id):
         """
         Get information about specified AMV.
+
+        Outdated metadata is returned as is and queued to be refreshed by the background service.
+
         :param int amv_id: Identifier of AMV.
         :return: AMV metadata.
-        :rtype: dict
-        """
-        format_version = 5
-
-        storage = PLUGIN.get_storage('amv_metadata')
-        if amv_id in storage and storage[amv_id].get('format', 0) == format_version:
-            if (datetime.datetime.now() - storage[amv_id]['timestamp']).days < 3:
-                return storage[amv_id]
-
-        html = self._get_html_page({'go': 'Files', 'in': 'view', 'id': amv_id})
-
-        metadata = {
-            'id': amv_id,
-            'timestamp': datetime.datetime.now(),
-            'format': format_version,
-            'amv': {
-                'title': html.find('h1', itemprop='name').text.strip(),
-                'description': html.find(itemprop='description').text.strip(),
-                'rating': float(html.find(itemprop='ratingValue').text.strip()),
-                'votes': int(html.find(itemprop='ratingCount').text.strip()),
-                'author': html.find('span', itemprop='name').text.strip(),
-                'genre': ', '.join(node.attrs['content'] for node in html.find_all(itemprop='genre')),
-            },
-        }
-
-        aired, added = self._get_amv_date(html)
-        metadata['amv']['aired'] = aired
-        metadata['amv']['added'] = added
-
-        user_rating_tag = html.find(id='vote-text')
-        user_rating = user_rating_tag.text.strip() if user_rating_tag else '-'
-        metadata['amv']['user_rating'] = float(0 if user_rating == '-' else user_rating)
-
-        metadata['video'] = self._get_video_metadata(html)
-        metadata['subtitles'] = self._get_subtitles_metadata(html)
-        metadata['images'] = self._get_images(html)
-        metadata['image'] = metadata['images'][0] if metadata['images'] else None
-
-        storage[amv_id] = metadata
+        :rtype: AmvInfo
+        """
+        metadata = self._get_cached_amv_list([amv_id]).get(amv_id)
+        if metadata is None:
+            self._login_for_details()
+            metadata = self._fetch_amv(amv_id)
+            self._store_amv_list([metadata])
         return metadata
 
+    def search_amv_list(self, query, page):
+        """
+        Find AMV in the local search index.
+
+        The site isn't queried, AMV are found among AMV which metadata has ever been obtained. Found AMV which full
+        metadata is still cached are described by it, other AMV are described by summary metadata taken from the index.
+
+        :param SearchQuery query: Search query.
+        :param int page: Page number.
+        :return: List of found AMV metadata and whether there are more found AMV on the next pages.
+        :rtype: tuple(list[AmvInfo|AmvSummary], bool)
+        """
+        with STATS.timer('storage'):
+            summaries = self.search_index.search(query, (page - 1) * SEARCH_PAGE_SIZE, SEARCH_PAGE_SIZE + 1)
+        has_more = len(summaries) > SEARCH_PAGE_SIZE
+        summaries = summaries[:SEARCH_PAGE_SIZE]
+        cached_metadata = self._get_cached_amv_list([summary.id for summary in summaries])
+        return [cached_metadata.get(summary.id, summary) for summary in summaries], has_more
+
+    def import_legacy_metadata(self):
+        """
+        Move metadata cached by version 4.1.0 and earlier of the plugin to the metadata store.
+
+        Former versions kept metadata in `amv_metadata` storage of xbmcswift2 which was never pruned. Its metadata is
+        imported once, so upgraded plugin doesn't download it again, and the storage file is deleted.
+        """
+        path = os.path.join(PLUGIN.storage_path, LEGACY_METADATA_STORAGE)
+        if not os.path.isfile(path):
+            return
+
+        storage = PLUGIN.get_storage(LEGACY_METADATA_STORAGE)
+        amv_info_list = [amv_info for amv_info in map(migrate_legacy_dict, storage.values()) if amv_info is not None]
+        for i in range(0, len(amv_info_list), LEGACY_IMPORT_PORTION):
+            self._store_amv_list(amv_info_list[i:i + LEGACY_IMPORT_PORTION])
+        PLUGIN.log.info('Metadata of %d AMV is imported from the former cache', len(amv_info_list))
+        # Storage may be saved again on exit of the plugin, so it is emptied in case the file is restored
+        storage.clear()
+        os.remove(path)
+
+    def rebuild_search_index(self):
+        """
+        Build the search index from the metadata cache if the index hasn't been built by this version of the plugin.
+        """
+        if self.search_index.is_outdated():
+            with STATS.timer('storage'):
+                self.search_index.rebuild(self.metadata_store.iter_all())
+
+    @_authenticated
     def set_amv_mark(self, amv_id, mark):
         """
         Set mark for AMV.
@@ -170,25 +381,34 @@ class AmvNewsBrowser(object):
         :param int amv_id: Identifier of AMV.
         :param int mark: Mark
         """
-        self.session.get(self.homepage, params={'go': 'Files', 'in': 'ajaxreiting', 'id': amv_id, 'vote': mark})
-        storage = PLUGIN.get_storage('amv_metadata')
-        storage[amv_id]['user_rating'] = mark
+        self._perform_action({'go': 'Files', 'in': 'ajaxreiting', 'id': amv_id, 'vote': mark})
+        self.metadata_store.delete_listings('evaluated:')
+        metadata = self.metadata_store.get(amv_id)
+        if metadata is not None:
+            metadata.user_rating = float(mark)
+            self.metadata_store.put(metadata)
 
+    @_authenticated
     def add_amv_to_favourites(self, amv_id):
         """
         Make AMV favorite.
 
         :param int amv_id: Identifier of AMV.
         """
-        self.session.get(self.homepage, params={'go': 'Files', 'in': 'addfav', 'id': amv_id})
+        self._perform_action({'go': 'Files', 'in': 'addfav', 'id': amv_id})
+        self.metadata_store.delete_listings('favourite:')
 
+    @_authenticated
     def remove_amv_from_favourites(self, amv_id):
         """
         Remove AMV from favourites.
 
         :param int amv_id: Identifier of AMV.
         """
-        self.session.get(self.homepage, params={'go': 'Files', 'in': 'delfav', 'id': amv_id})
+        self._perform_action({'go': 'Files', 'in': 'delfav', 'id': amv_id})
+        self.metadata_store.delete_listings('favourite:')
+        # Incremental synchronization of favourites doesn't crawl the whole listing, so it can't notice the removal
+        self.sync_store.put_removed(self.get_listing_scope('favourite'), [amv_id])
 
     def download(self, save_path, amv_id, subtitles_id=None):
         """
@@ -198,234 +418,271 @@ class AmvNewsBrowser(object):
         :param int amv_id: Identifier of AMV.
         :param int subtitles_id: Identifier of AMV subtitles.
         """
-        sync_file = os.path.join(save_path, '%d.sync' % amv_id)
-        if xbmcvfs.exists(sync_file):
-            # AMV is already downloaded
-            return
+        from downloads import DownloadManager
 
-        amv_info = self.get_amv(amv_id)
+        manager = DownloadManager(self, save_path, PLUGIN.get_setting('download_workers', int))
+        manager.add(self.get_amv(amv_id), subtitles_id)
+        manager.wait()
 
-        self._download_file(self.get_amv_url(amv_id), save_path, str(amv_id))
-        self._create_nfo_file(save_path, amv_info)
+    def _restore_session(self):
+        """
+        Restore cookies of the session authenticated by one of the previous plugin invocations.
 
-        if amv_info['images']:
-            self._download_file(amv_info['images'][0], save_path, '%d-poster' % amv_id)
-            if len(amv_info['images']) > 1:
-                self._download_file(amv_info['images'][1], save_path, '%d-fanart' % amv_id)
+        :return: Whether the session is restored.
+        :rtype: bool
+        """
+        storage = PLUGIN.get_storage('session')
+        if storage.get('username') != PLUGIN.get_setting('username') or 'cookies' not in storage:
+            return False
 
-        if subtitles_id:
-            self._download_file(self.get_subtitles_url(subtitles_id), save_path, str(amv_id))
+        cookies = storage['cookies']
+        cookies.clear_expired_cookies()
+        if not cookies:
+            return False
 
-        try:
-            f = xbmcvfs.File(sync_file, 'w')
-        finally:
-            f.close()
+        self.session.cookies.update(cookies)
+        return True
 
-    def _create_nfo_file(self, save_path, amv_info):
+    def _login(self, expired_generation=None):
         """
-        Create .nfo file
+        Authenticate on the site and save cookies of the session for subsequent plugin invocations.
 
-        :param str save_path: Local path where AMV will be saved.
-        :param dict amv_info: AMV information.
-        """
-        music_video = etree.Element('musicvideo')
-        etree.SubElement(music_video, 'title').text = amv_info['amv']['title']
-        etree.SubElement(music_video, 'userrating').text = str(amv_info['amv']['user_rating'] * 2)
-        etree.SubElement(music_video, 'plot').text = amv_info['amv']['description']
-        etree.SubElement(music_video, 'year').text = amv_info['amv']['aired'].split('-')[0]
-        etree.SubElement(music_video, 'dateadded').text = amv_info['amv']['added']
-        etree.SubElement(music_video, 'director').text = amv_info['amv']['author']
-        etree.SubElement(music_video, 'playcount').text = '1'
-        for genre in amv_info['amv']['genre'].split(','):
-            etree.SubElement(music_video, 'genre').text = genre.strip()
-
-        tree = etree.ElementTree(music_video)
-
-        temp_fullpath = xbmc.translatePath(os.path.join('special://temp', '%d.nfo' % amv_info['id']))
-        save_fullpath = os.path.join(save_path, '%d.nfo' % amv_info['id'])
-        tree.write(temp_fullpath, encoding='utf-8', xml_declaration=True)
-        xbmcvfs.copy(temp_fullpath, save_fullpath)
-        xbmcvfs.delete(temp_fullpath)
-
-    @staticmethod
-    def _download_file(url, path, filename):
-        """
-        Download file.
-
-        :param str url: URL of the file.
-        :param str path: Local path where file will be saved.
-        :param str filename: Filename to be assigned to the downloaded file.
-        :return: Full path to the downloaded file.
-        :rtype: str
+        :param int|None expired_generation: Generation of the session detected as expired. Login is skipped if the
+            session has been renewed by another thread since then.
         """
-        response = requests.get(url, stream=True)
-        extension = response.url.rsplit('.', 1)[1]
-        filename = '%s.%s' % (filename, extension)
+        with self._login_lock:
+            if expired_generation is not None and expired_generation != self._login_generation:
+                return
 
-        full_path = os.path.join(path, filename)
+            self.session.cookies.clear()
+            with STATS.timer('login'):
+                self.http.post(get_homepage(), params={'go': 'Members'}, data={
+                    'user_name': PLUGIN.get_setting('username'),
+                    'user_password': PLUGIN.get_setting('password'),
+                    'login': '%C2%EE%E9%F2%E8...'
+                })
+            self._login_generation += 1
+            self.authenticated = True
 
-        try:
-            f = xbmcvfs.File(os.path.join(path, filename), 'w')
-            for chunk in response.iter_content(chunk_size=128):
-                f.write(chunk)
-        finally:
-            f.close()
+            storage = PLUGIN.get_storage('session')
+            storage['username'] = PLUGIN.get_setting('username')
+            storage['cookies'] = self.session.cookies.copy()
 
-        return full_path
+    def _login_for_details(self):
+        """
+        Authenticate on the site before AMV pages are fetched if credentials are configured.
 
-    @classmethod
-    def _get_full_url(cls, url_params):
+        AMV page shows the mark given by the user to authenticated visitors only, so metadata fetched anonymously
+        would overwrite the mark with 0 in the cache shared by all listings.
         """
-        Get full URL to query https://amvnews.ru with specified URL params.
+        if not self.authenticated and PLUGIN.get_setting('username') and PLUGIN.get_setting('password'):
+            self._login()
 
-        :param dict url_params: URL params.
-        :return: Full URL.
-        :rtype: str
+    def _is_session_expired(self, response):
+        """
+        Check whether the site has rejected cookies of the authenticated session.
+
+        The site shows login form to anonymous visitors only, so its presence for an authenticated user means that
+        the session is expired.
+
+        :param requests.Response response: Response of the site.
+        :rtype: bool
+        """
+        return self.authenticated and 'name="user_password"' in response.text
+
+    def _perform_action(self, url_params):
+        """
+        Perform action of the authenticated user on the site.
+
+        If the site has rejected cookies of the session, the browser is authenticated again and the action is
+        repeated, so the action isn't silently ignored by the site.
+
+        :param dict url_params: URL params of the action.
+        :raise requests.HTTPError: If the site has failed to perform the action.
         """
-        return '{}?{}'.format(cls.homepage, urllib.parse.urlencode(url_params))
+        login_generation = self._login_generation
+        response = self.http.get(get_homepage(), params=url_params)
+        response.raise_for_status()
+        if self._is_session_expired(response):
+            self._login(expired_generation=login_generation)
+            response = self.http.get(get_homepage(), params=url_params)
+            response.raise_for_status()
 
-    def _get_html_page(self, url_params):
+    def _get_listing_page(self, listing, page):
+        """
+        Get entries of listing page.
+
+        Recently downloaded pages are taken from the cache, so prefetched page is shown without network requests.
+
+        :param str listing: Name of listing ('featured', 'evaluated' or 'favourite').
+        :param int page: Page number.
+        :return: Summary metadata of AMV for featured listing, identifiers of AMV for other listings.
+        :rtype: list[AmvSummary]|list[int]
+        """
+        key = '{}:{}'.format(self.get_listing_scope(listing), page)
+        entries = self.metadata_store.get_listing(key, LISTING_TTL)
+        if entries is None:
+            url_params = dict(LISTING_URL_PARAMS[listing], page=(page - 1) * 10)
+            if listing == 'featured':
+                entries = parse_featured_summaries(self._get_html_page(url_params))
+            else:
+                entries = parse_amv_ids(self._get_html_page(url_params, RATESTOP_FILTER))
+            self.metadata_store.put_listing(key, entries)
+        return entries
+
+    def _get_cached_amv_list(self, amv_ids):
+        """
+        Get information about several AMV from the cache and queue outdated metadata to be refreshed.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: Metadata of cached AMV by their identifiers.
+        :rtype: dict[int, AmvInfo]
+        """
+        with STATS.timer('storage'):
+            result = self.metadata_store.get_many(amv_ids)
+        outdated_since = time.time() - self.metadata_ttl.total_seconds()
+        outdated_ids = [amv_id for amv_id, metadata in result.items() if metadata.timestamp < outdated_since]
+        self.task_queue.put(TASK_REFRESH_AMV, outdated_ids, PRIORITY_BACKGROUND)
+
+        STATS.count('metadata_hit', len(result) - len(outdated_ids))
+        STATS.count('metadata_stale', len(outdated_ids))
+        STATS.count('metadata_miss', len(set(amv_ids)) - len(result))
+        return result
+
+    def _fetch_amv_list(self, amv_ids):
+        """
+        Download information about several AMV concurrently by a bounded pool of workers and put it to the cache.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: Metadata of AMV which has been obtained and errors which have occurred for other AMV by identifiers.
+        :rtype: tuple(dict[int, AmvInfo], dict[int, Exception])
+        """
+        result, errors = {}, {}
+        if not amv_ids:
+            return result, errors
+
+        self._login_for_details()
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(amv_ids))) as executor:
+            futures = {amv_id: executor.submit(self._fetch_amv, amv_id) for amv_id in amv_ids}
+        for amv_id, future in futures.items():
+            try:
+                result[amv_id] = future.result()
+            except Exception as e:
+                # Page which can't be parsed fails its AMV only, other AMV are stored anyway
+                errors[amv_id] = e
+
+        self._store_amv_list(list(result.values()))
+        return result, errors
+
+    def _store_amv_list(self, amv_info_list):
+        """
+        Put metadata of AMV obtained from the site to the cache and to the search index.
+
+        :param list[AmvInfo] amv_info_list: Metadata of AMV.
+        """
+        with STATS.timer('storage'):
+            self.metadata_store.put_many(amv_info_list)
+            self.search_index.put_many(amv_info_list)
+
+    def _fetch_amv(self, amv_id):
+        """
+        Download and parse information about specified AMV.
+
+        The method doesn't touch the cache, so it is safe to call it from several threads at once. The browser has to
+        be authenticated before if credentials are configured, so the mark given by the user is obtained.
+
+        :param int amv_id: Identifier of AMV.
+        :return: AMV metadata.
+        :rtype: AmvInfo
+        """
+        html = self._get_html_page({'go': 'Files', 'in': 'view', 'id': amv_id}, DETAIL_PAGE_FILTER)
+
+        with STATS.timer('parse'):
+            metadata = parse_amv_page(html)
+        metadata.id = amv_id
+        metadata.timestamp = time.time()
+        return metadata
+
+    def _get_html_page(self, url_params, parse_only=None):
         """
         Get HTML page generated by https://amvnews.ru for specified URL params.
 
+        Page is taken from the HTTP cache if the site confirms that it isn't modified.
+
         :param dict url_params: URL params.
+        :param parse_only: Filter of tags to be parsed, the whole page is parsed if it isn't specified.
         :return: Parsed HTML page.
         :rtype: BeautifulSoup
         """
-        return BeautifulSoup(self.session.get(self.homepage, params=url_params).text.replace('&#...', '...'))
-
-    @staticmethod
-    def _get_amv_date(html):
-        """
-        Get information when AMV was aired and when AMV was added to the site.
-
-        :param BeautifulSoup html: Parsed HTML page.
-        :return: Dates when AMV was aired and when AMV was added to the site.
-        :rtype: tuple(str, str)
-        """
-        aired = ''
-        match = REGEX_AMV_AIRED.match(html.find(attrs={'id': 'author-block'}).text)
-        if match:
-            day = match.groupdict()['day']
-            month = match.groupdict()['month']
-            year = match.groupdict()['year']
-            aired = '{}-{}-{}'.format(year, month, day)
-
-        added = ''
-        match = REGEX_AMV_ADDED.match(html.find(attrs={'id': 'sender-block'}).text)
-        if match:
-            day = match.groupdict()['day']
-            month = match.groupdict()['month']
-            year = match.groupdict()['year']
-            hour = match.groupdict()['hour']
-            minute = match.groupdict()['minute']
-            added = '{}-{}-{} {}:{}:00'.format(year, month, day, hour, minute)
-
-        return aired, added
-
-    @staticmethod
-    def _get_images(html):
-        """
-        Get AMV related images/screenshots.
-
-        :param BeautifulSoup html: Parsed HTML page.
-        :return: List of image's URL
-        :rtype: list[str]
-        """
-        images = []
-        main_image_tag = html.find(itemprop='image')
-        main_image_alt = None
-        if main_image_tag:
-            images.append('https://amvnews.ru{}'.format(main_image_tag.attrs['src']))
-            main_image_alt = main_image_tag.attrs['alt']
-
-        title = html.find('h1', itemprop='name').text.strip()
-        for image_tag in html.find_all('img', alt=[title, main_image_alt]):
-            image_url = 'https://amvnews.ru{}'.format(image_tag.attrs['src'])
-            if image_url not in images:
-                images.append('https://amvnews.ru{}'.format(image_tag.attrs['src']))
-
-        return images
-
-    @staticmethod
-    def _get_video_metadata(html):
-        """
-        Get information about video file.
-
-        :param BeautifulSoup html: Parsed HTML page.
-        :return: Video file metadata.
-        :rtype: dict
-        """
-        result = {}
-        file_block = html.find(id='main-link-block').find('a').attrs['onmouseover']
-
-        duration = 0
-        match = REGEX_AMV_DURATION.match(file_block)
-        if match:
-            minutes, seconds = match.groupdict()['min'], match.groupdict()['sec']
-            if minutes:
-                duration += int(minutes) * 60
-            if seconds:
-                duration += int(seconds)
-        result['duration'] = duration
-
-        size_in_bytes = 0
-        match = REGEX_AMV_SIZE.match(file_block)
-        if match:
-            size = match.groupdict()['size']
-            if size:
-                size_in_bytes = int(float(size) * 1024 * 1024)
-        result['size'] = size_in_bytes
-
-        video_codec, audio_codec = '', ''
-        match = REGEX_AMV_CODECS.match(file_block)
-        if match:
-            video_codec = match.groupdict()['video']
-            audio_codec = match.groupdict()['audio']
-        result['video_codec'] = video_codec
-        result['audio_codec'] = audio_codec
-
-        width, height, aspect = 0, 0, 0.0
-        match = REGEX_AMV_RESOLUTION.match(file_block)
-        if match:
-            width = int(match.groupdict()['width'])
-            height = int(match.groupdict()['height'])
-            aspect = float(width) / float(height)
-        result['width'] = width
-        result['height'] = height
-        result['aspect'] = aspect
+        login_generation = self._login_generation
+        response, cached_response = self._get_page_response(url_params)
+        if response.status_code != 304 and self._is_session_expired(response):
+            self._login(expired_generation=login_generation)
+            response, cached_response = self._get_page_response(url_params)
+        text = cached_response.text if response.status_code == 304 else response.text
+        with STATS.timer('parse'):
+            return parse_html(text, parse_only)
 
-        return result
+    def _get_page_response(self, url_params):
+        """
+        Request page revalidating its cached copy and put the received page to the HTTP cache.
+
+        :param dict url_params: URL params.
+        :return: Response of the site and cached response if the page has been cached.
+        :rtype: tuple(requests.Response, CachedResponse|None)
+        """
+        key = self.http_cache.get_key(url_params, PLUGIN.get_setting('username') if self.authenticated else '')
+        cached_response = self.http_cache.get(key)
+        response = self._request_page(url_params, self.http_cache.get_conditional_headers(cached_response))
+        if response.status_code == 304 and cached_response is None:
+            response = self._request_page(url_params)
+        if response.status_code != 304:
+            self.http_cache.put(key, response)
+        return response, cached_response
+
+    def _request_page(self, url_params, headers=None):
+        """
+        Request page and record network statistics.
+
+        :param dict url_params: URL params.
+        :param dict|None headers: Additional headers of the request.
+        :return: Response of the site.
+        :rtype: requests.Response
+        """
+        # Time of waiting for the rate limiter is recorded separately
+        self.http.wait_for_turn()
+        with STATS.timer('network'):
+            response = self.http.get(get_homepage(), params=url_params, headers=headers, limited=False)
+            STATS.count('network_bytes', len(response.content))
+        STATS.count('http_{}'.format(response.status_code))
+        response.raise_for_status()
+        return response
+
+
+# URL params of AMV listings
+LISTING_URL_PARAMS = {
+    'featured': {'go': 'News', 'in': 'cat', 'id': 1},
+    'evaluated': {'go': 'Files', 'file': 'votes'},
+    'favourite': {'go': 'Files', 'file': 'favor'},
+}
+
+# Time while downloaded listing page is considered to be up to date (seconds)
+LISTING_TTL = 5 * 60
+
+# Storage of AMV metadata used by version 4.1.0 and earlier
+LEGACY_METADATA_STORAGE = 'amv_metadata'
+
+# Number of AMV imported from the former metadata storage by a single transaction
+LEGACY_IMPORT_PORTION = 500
+
+# Number of AMV on a page of search results
+SEARCH_PAGE_SIZE = 20
+
+# Crawling of the catalog ends after this number of missing AMV following the newest AMV
+CRAWL_END_MARGIN = 20
+
+# Interval between crawlings of AMV added to the catalog (seconds)
+CRAWL_INTERVAL = 24 * 60 * 60
 
-    @staticmethod
-    def _get_subtitles_metadata(html):
-        """
-        Get information about subtitles files.
-
-        :param BeautifulSoup html: Parsed HTML page.
-        :return: Subtitles files metadata.
-        :rtype: list[tuple(Language, int)]
-        """
-        subtitles = []
-        subtitles_block = html.find(attrs={'id': 'subtitles-block'})
-        if subtitles_block:
-            for subtitles_info in subtitles_block.find_all('a'):
-                subtitles_id = int(REGEX_AMV_SUB_ID.match(subtitles_info.attrs['href']).groupdict()['id'])
-                if u'английский' in subtitles_info.attrs['onmouseover']:
-                    subtitles_lang = Language.English
-                elif u'русский' in subtitles_info.attrs['onmouseover']:
-                    subtitles_lang = Language.Russian
-                else:
-                    subtitles_lang = Language.Unknown
-                subtitles.append((subtitles_lang, subtitles_id))
-        return subtitles
-
-
-REGEX_AMV_ID = re.compile(u'^.*id=(?P<id>\\d+).*$', re.S)
-REGEX_AMV_SUB_ID = re.compile(u'^.*sub=(?P<id>\\d+).*$', re.S)
-REGEX_AMV_SIZE = re.compile(u'^.*Размер</b>: ((?P<size>[\\d.]+) Мб)?.*$', re.S)
-REGEX_AMV_CODECS = re.compile(u'^.*Кодеки</b>: (?P<video>.+?)/(?P<audio>.+?)<BR>.*$', re.S)
-REGEX_AMV_RESOLUTION = re.compile(u'^.*Разрешение</b>: (?P<width>\\d+)x(?P<height>\\d+)@(?P<fps>[\\d.]+).*$', re.S)
-REGEX_AMV_DURATION = re.compile(u'^.*Длительность</b>: ((?P<min>\\d+) мин )?((?P<sec>\\d+) сек)?.*$', re.S)
-REGEX_AMV_AIRED = re.compile(u'^.*(?P<day>\\d{2})\\.(?P<month>\\d{2})\\.(?P<year>\\d{4}).*$', re.S)
-REGEX_AMV_ADDED = re.compile(u'^.*(?P<day>\\d{2})\\.(?P<month>\\d{2})\\.(?P<year>\\d{4}).*(?P<hour>\\d{2}):(?P<minute>\\d{2}).*$', re.S)  # noqa
+# Delay of crawling after a network error (seconds)
+CRAWL_RETRY_DELAY = 10 * 60
@@ -0,0 +1,94 @@
+# coding=utf-8
+"""
+Micro-benchmark of AMV page parsing.
+
+Compares the former parsing path (full BeautifulSoup tree and separate lookups for every field) with the current
+one (filtered tree and a single pass) on saved AMV pages and checks that both produce the same metadata.
+
+Usage: python benchmarks/bench_parsing.py [number of repeats]
+"""
+import glob
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+import parsers  # noqa: E402
+from metadata import AmvInfo  # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+
+def legacy_parse(text):
+    """
+    Parse AMV page the way it was done before single pass parsing.
+
+    :param str text: HTML page.
+    :return: AMV metadata.
+    :rtype: AmvInfo
+    """
+    html = BeautifulSoup(text.replace('&#...', '...'), 'html.parser')
+
+    user_rating_tag = html.find(id='vote-text')
+    user_rating = user_rating_tag.text.strip() if user_rating_tag else '-'
+    aired, added = parsers._parse_amv_date(
+        html.find(attrs={'id': 'author-block'}).text, html.find(attrs={'id': 'sender-block'}).text)
+
+    images = []
+    main_image_tag = html.find(itemprop='image')
+    main_image_alt = None
+    if main_image_tag:
+        images.append('https://amvnews.ru{}'.format(main_image_tag.attrs['src']))
+        main_image_alt = main_image_tag.attrs['alt']
+    title = html.find('h1', itemprop='name').text.strip()
+    for image_tag in html.find_all('img', alt=[title, main_image_alt]):
+        image_url = 'https://amvnews.ru{}'.format(image_tag.attrs['src'])
+        if image_url not in images:
+            images.append(image_url)
+
+    return AmvInfo(
+        None,
+        title=html.find('h1', itemprop='name').text.strip(),
+        description=html.find(itemprop='description').text.strip(),
+        rating=float(html.find(itemprop='ratingValue').text.strip()),
+        votes=int(html.find(itemprop='ratingCount').text.strip()),
+        author=html.find('span', itemprop='name').text.strip(),
+        genre=', '.join(node.attrs['content'] for node in html.find_all(itemprop='genre')),
+        aired=aired,
+        added=added,
+        user_rating=float(0 if user_rating == '-' else user_rating),
+        video=parsers._parse_video_metadata(html.find(id='main-link-block').find('a').attrs['onmouseover']),
+        subtitles=parsers._parse_subtitles_metadata(html.find(attrs={'id': 'subtitles-block'})),
+        images=images,
+    )
+
+
+def current_parse(text):
+    """
+    Parse AMV page the way AmvNewsBrowser does it.
+
+    :param str text: HTML page.
+    :return: AMV metadata.
+    :rtype: AmvInfo
+    """
+    return parsers.parse_amv_page(parsers.parse_html(text, parsers.DETAIL_PAGE_FILTER))
+
+
+def main(repeats):
+    pages = sorted(glob.glob(os.path.join(FIXTURES_PATH, 'amv_view_*.html')))
+    print('Parser: {}, repeats: {}'.format(parsers.HTML_PARSER, repeats))
+    for path in pages:
+        with open(path, encoding='utf-8') as f:
+            text = f.read()
+        assert legacy_parse(text) == current_parse(text), 'Parsing results differ for {}'.format(path)
+
+        legacy_time = timeit.timeit(lambda: legacy_parse(text), number=repeats) / repeats
+        current_time = timeit.timeit(lambda: current_parse(text), number=repeats) / repeats
+        print('{:<24} legacy {:8.2f} ms   current {:8.2f} ms   speedup x{:.2f}'.format(
+            os.path.basename(path), legacy_time * 1000, current_time * 1000, legacy_time / current_time))
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,181 @@
+# coding=utf-8
+"""
+Benchmark of the plugin against the local stand-in for https://amvnews.ru.
+
+Kodi modules are replaced by stubs from `benchmarks/stubs`, the site is replaced by `benchmarks/server.py`, so the
+benchmark runs without Kodi and network access. Every scenario is measured on cold caches (empty profile of the
+plugin before every run) and on warm caches (profile filled by the previous runs and by the background service).
+Time and number of requests to the site are reported for every scenario.
+
+Usage: python benchmarks/bench_plugin.py [number of repeats]
+"""
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_PATH))
+sys.path.insert(0, os.path.join(BENCHMARKS_PATH, 'stubs'))
+
+import xbmc  # noqa: E402
+import xbmcswift2.plugin  # noqa: E402
+from server import AmvNewsHandler, start_server  # noqa: E402
+
+WORK_PATH = tempfile.mkdtemp(prefix='amvnews-bench-')
+PROFILE_PATH = os.path.join(WORK_PATH, 'profile')
+DOWNLOAD_PATH = os.path.join(WORK_PATH, 'downloads')
+
+xbmc.SPECIAL_PATH = WORK_PATH
+xbmcswift2.plugin.PROFILE_PATH = PROFILE_PATH
+xbmcswift2.plugin.SETTINGS.update({
+    'username': 'benchmark',
+    'password': 'benchmark',
+    'subtitles_lang': '0',
+    'download_path': DOWNLOAD_PATH,
+    'download_favourites': 'false',
+    'download_evaluated': 'false',
+    'download_treshold': '3',
+    'sync_incremental': 'true',
+    'download_workers': '3',
+    'max_workers': '4',
+    'http_cache_size': '20',
+    'metadata_cache_rows': '50000',
+    'metadata_cache_size': '100',
+    'metadata_ttl': '3',
+    'prefetch': 'true',
+    'collect_stats': 'false',
+    'http_pool_size': '10',
+    'http_connect_timeout': '10',
+    'http_read_timeout': '30',
+    'http_retries': '3',
+    # The local server doesn't need to be spared, the benchmark measures the plugin itself
+    'rate_limit': '1000',
+    'crawl_catalog': 'false',
+})
+
+import parsers  # noqa: E402
+import routes  # noqa: E402
+import service  # noqa: E402
+import urls  # noqa: E402
+from amvnews import AmvNewsBrowser  # noqa: E402
+from constants import PLUGIN  # noqa: E402
+
+
+def use_site(url):
+    """
+    Direct the plugin to another site.
+
+    :param str url: URL of the site without trailing slash.
+    """
+    urls.SITE_URL = url
+
+
+def reset_profile():
+    """
+    Remove caches, session and downloads of the plugin.
+    """
+    shutil.rmtree(PROFILE_PATH, ignore_errors=True)
+    PLUGIN.storages.clear()
+    reset_downloads()
+
+
+def reset_downloads():
+    """
+    Remove downloaded files and the download manifest.
+    """
+    shutil.rmtree(DOWNLOAD_PATH, ignore_errors=True)
+    os.makedirs(DOWNLOAD_PATH)
+    for filename in os.listdir(PLUGIN.storage_path):
+        if filename.startswith('downloads.db') or filename.startswith('sync.db'):
+            os.remove(os.path.join(PLUGIN.storage_path, filename))
+
+
+def run_service_tasks():
+    """
+    Execute tasks queued for the background service.
+    """
+    browser = AmvNewsBrowser()
+    monitor = xbmc.Monitor()
+    while service._run_next_task(browser, monitor):
+        pass
+
+
+def crawl_catalog():
+    """
+    Crawl the whole site catalog portion by portion.
+    """
+    browser = AmvNewsBrowser()
+    while browser.crawl_state.is_due():
+        browser.crawl_catalog()
+
+
+# Scenarios: name, function and whether downloads should be removed before every run
+SCENARIOS = [
+    ('AmvNewsBrowser.get_amv', lambda: AmvNewsBrowser().get_amv(101), False),
+    ('AmvNewsBrowser.get_featured_amv_list', lambda: AmvNewsBrowser().get_featured_amv_list(1), False),
+    ('AmvNewsBrowser.get_evaluated_amv_list', lambda: AmvNewsBrowser().get_evaluated_amv_list(1), False),
+    ('AmvNewsBrowser.get_favourite_amv_list', lambda: AmvNewsBrowser().get_favourite_amv_list(1), False),
+    ('AmvNewsBrowser.download', lambda: AmvNewsBrowser().download(DOWNLOAD_PATH, 102, 1021), True),
+    ('routes.create_main_listing', lambda: routes.create_main_listing(), False),
+    ('routes.create_featured_amv_list', lambda: routes.create_featured_amv_list('0'), False),
+    ('routes.create_evaluated_amv_list', lambda: routes.create_evaluated_amv_list('0'), False),
+    ('routes.create_favourite_amv_list', lambda: routes.create_favourite_amv_list('0'), False),
+    ('routes.resolve_and_play', lambda: routes.resolve_and_play('103'), False),
+    ('routes.download', lambda: routes.download('104'), True),
+    ('routes.download_favourites', lambda: routes.download_favourites(), True),
+    ('routes.download_evaluated', lambda: routes.download_evaluated(), True),
+    ('AmvNewsBrowser.crawl_catalog', crawl_catalog, False),
+]
+
+
+def measure(function, repeats, cold, clean_downloads):
+    """
+    Measure the scenario.
+
+    :param callable function: Scenario.
+    :param int repeats: Number of runs.
+    :param bool cold: Whether the profile is removed before every run.
+    :param bool clean_downloads: Whether downloads are removed before every run.
+    :return: Median time of the run (seconds) and median number of requests to the site.
+    :rtype: tuple(float, int)
+    """
+    reset_profile()
+    if not cold:
+        function()
+        run_service_tasks()
+
+    times, requests_counts = [], []
+    for _ in range(repeats):
+        if cold:
+            reset_profile()
+        elif clean_downloads:
+            reset_downloads()
+        requests_count = AmvNewsHandler.requests_count
+        started = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - started)
+        requests_counts.append(AmvNewsHandler.requests_count - requests_count)
+    return statistics.median(times), int(statistics.median(requests_counts))
+
+
+def main(repeats):
+    server, url = start_server()
+    use_site(url)
+    print('Parser: {}, repeats: {}'.format(parsers.HTML_PARSER, repeats))
+    print('{:<40} {:>10} {:>9} {:>10} {:>9}'.format('scenario', 'cold, ms', 'requests', 'warm, ms', 'requests'))
+    try:
+        for name, function, clean_downloads in SCENARIOS:
+            cold_time, cold_requests = measure(function, repeats, True, clean_downloads)
+            warm_time, warm_requests = measure(function, repeats, False, clean_downloads)
+            print('{:<40} {:>10.1f} {:>9} {:>10.1f} {:>9}'.format(
+                name, cold_time * 1000, cold_requests, warm_time * 1000, warm_requests))
+    finally:
+        server.shutdown()
+        shutil.rmtree(WORK_PATH, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
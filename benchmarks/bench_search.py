@@ -0,0 +1,148 @@
+# coding=utf-8
+"""
+Benchmark of the local search index.
+
+The index is filled by synthetic metadata of many AMV in portions, the way metadata arrives from the site, then
+updated metadata of some AMV is put again. Time of indexing, size of the index and latency of typical queries are
+reported. Found AMV are checked against a plain scan of the synthetic metadata.
+
+Usage: python benchmarks/bench_search.py [number of AMV]
+"""
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from helpers import Language  # noqa: E402
+from metadata import AmvInfo, SubtitlesInfo, VideoInfo  # noqa: E402
+from search import SearchIndex, get_terms, parse_query  # noqa: E402
+
+# Number of AMV put to the index at once, it is the number of AMV on a listing page
+PORTION_SIZE = 10
+
+# Number of results on a page of search results
+PAGE_SIZE = 20
+
+# Queries measured by the benchmark
+QUERIES = [
+    'naruto',
+    'na',
+    'naruto bleach',
+    'author:ki',
+    'genre:drama rating:4',
+    'lang:en duration:3-5',
+    '1080p rating:4.5',
+    'rating:3',
+]
+
+SYLLABLES = ['na', 'ru', 'to', 'ble', 'ach', 'ki', 'mi', 'ko', 'sa', 'yo', 'ri', 'ta', 'shi', 'ne', 'ho', 'dra', 'ma']
+GENRES = ['Action', 'Drama', 'Comedy', 'Romance', 'Sentimental', 'Trailer', 'Fun', 'Horror', 'Epic', 'Dance']
+
+
+def generate_amv(rng, amv_id):
+    """
+    Generate metadata of AMV with words following Zipf-like distribution.
+
+    :param random.Random rng: Random generator.
+    :param int amv_id: Identifier of AMV.
+    :rtype: AmvInfo
+    """
+    def syllable():
+        return SYLLABLES[min(int(rng.paretovariate(1.2)) - 1, len(SYLLABLES) - 1)]
+
+    def word():
+        return ''.join(syllable() for _ in range(rng.randint(1, 3)))
+
+    def text(length):
+        return ' '.join(word() for _ in range(length))
+
+    height = rng.choice([360, 480, 576, 720, 1080, 2160])
+    return AmvInfo(
+        amv_id, text(rng.randint(2, 5)), text(rng.randint(20, 80)), round(rng.uniform(0, 5), 2), rng.randint(0, 500),
+        text(rng.randint(1, 2)), ', '.join(rng.sample(GENRES, rng.randint(1, 3))), '2019-03-15', '2019-03-21 18:45:00',
+        0.0, VideoInfo(rng.randint(60, 600), rng.randint(10, 500) * 1024 * 1024, 'H.264', 'AAC', height * 16 // 9,
+                       height, 23.976),
+        [SubtitlesInfo(amv_id * 10 + i, rng.choice([Language.Russian, Language.English])) for i in
+         range(rng.randint(0, 2))],
+        ['https://amvnews.ru/images/{}.jpg'.format(amv_id)], time.time())
+
+
+def scan(amv_list, query):
+    """
+    Find AMV matching the query by plain scan of their metadata.
+
+    :param list[AmvInfo] amv_list: Metadata of AMV.
+    :param SearchQuery query: Search query.
+    :return: Identifiers of found AMV in the order of the index.
+    :rtype: list[int]
+    """
+    columns = {
+        'rating': lambda amv_info: amv_info.rating,
+        'duration': lambda amv_info: amv_info.video.duration,
+        'height': lambda amv_info: amv_info.video.height,
+    }
+    result = []
+    for amv_info in amv_list:
+        terms = get_terms(amv_info)
+        if not all(any(term.startswith(prefix) for term in terms) for prefix in query.terms):
+            continue
+        values = {column: get_value(amv_info) for column, get_value in columns.items()}
+        if not all((low is None or values[column] >= low) and (high is None or values[column] <= high)
+                   for column, (low, high) in query.ranges.items()):
+            continue
+        result.append(amv_info)
+    return [amv_info.id for amv_info in sorted(result, key=lambda amv_info: (-amv_info.rating, -amv_info.id))]
+
+
+def main(amv_count):
+    rng = random.Random(0)
+    amv_list = [generate_amv(rng, amv_id) for amv_id in range(1, amv_count + 1)]
+    work_path = tempfile.mkdtemp(prefix='amvnews-bench-')
+    try:
+        path = os.path.join(work_path, 'search.db')
+        index = SearchIndex(path)
+
+        started = time.perf_counter()
+        for i in range(0, len(amv_list), PORTION_SIZE):
+            index.put_many(amv_list[i:i + PORTION_SIZE])
+        indexing_time = time.perf_counter() - started
+
+        updated = [generate_amv(rng, amv_info.id) for amv_info in rng.sample(amv_list, PORTION_SIZE * 100)]
+        started = time.perf_counter()
+        for i in range(0, len(updated), PORTION_SIZE):
+            index.put_many(updated[i:i + PORTION_SIZE])
+        updating_time = time.perf_counter() - started
+        updated_ids = {amv_info.id: amv_info for amv_info in updated}
+        amv_list = [updated_ids.get(amv_info.id, amv_info) for amv_info in amv_list]
+
+        print('AMV: {}, index size: {:.1f} Mb'.format(amv_count, os.path.getsize(path) / 1024.0 / 1024.0))
+        print('indexing: {:.2f} ms per portion of {} AMV, updating: {:.2f} ms per portion'.format(
+            indexing_time * 1000 / (amv_count / PORTION_SIZE), PORTION_SIZE,
+            updating_time * 1000 / (len(updated) / PORTION_SIZE)))
+        print('{:<28} {:>8} {:>14} {:>14}'.format('query', 'found', 'first page, ms', 'page 10, ms'))
+        for text in QUERIES:
+            query = parse_query(text)
+            expected = scan(amv_list, query)
+            found = [summary.id for summary in index.search(query, 0, len(amv_list))]
+            assert found == expected, 'Search results differ for {!r}'.format(text)
+
+            timings = []
+            for offset in (0, 9 * PAGE_SIZE):
+                times = []
+                for _ in range(5):
+                    started = time.perf_counter()
+                    index.search(query, offset, PAGE_SIZE + 1)
+                    times.append(time.perf_counter() - started)
+                timings.append(statistics.median(times) * 1000)
+            print('{:<28} {:>8} {:>14.2f} {:>14.2f}'.format(text, len(found), *timings))
+    finally:
+        shutil.rmtree(work_path, ignore_errors=True)
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 30000)
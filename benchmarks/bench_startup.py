@@ -0,0 +1,131 @@
+# coding=utf-8
+"""
+Benchmark of plugin startup.
+
+Kodi starts a new Python process for every plugin invocation, so modules imported by the plugin are loaded again on
+every click. Every route is run in a fresh interpreter with `-X importtime` (Kodi modules are replaced by stubs from
+`benchmarks/stubs`), time of imports made by the plugin is reported together with the heaviest of them. Routes which
+only build URLs have a budget and must not import modules of HTTP and HTML parsing libraries.
+
+Usage: python benchmarks/bench_startup.py [number of repeats]
+"""
+import os
+import statistics
+import subprocess
+import sys
+
+BENCHMARKS_PATH = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_PATH = os.path.dirname(BENCHMARKS_PATH)
+
+# Modules which must not be imported by the lightweight routes
+HEAVY_MODULES = frozenset(['requests', 'urllib3', 'bs4', 'lxml', 'xml.etree.ElementTree', 'sqlite3', 'concurrent'])
+
+# Routes: name of the view, its arguments and budget of import time (milliseconds, None if it isn't limited).
+# Views without arguments access the site, they aren't called but the modules they need are imported.
+ROUTES = [
+    ('create_main_listing', [], 25),
+    ('play', ['101'], 25),
+    ('create_featured_amv_list', None, None),
+]
+
+# Number of the heaviest imports shown for every route
+TOP_IMPORTS = 5
+
+# Line written to stderr once Kodi stubs are imported, only imports after it are made by the plugin
+MARKER = 'plugin imports start'
+
+# Script which imports the plugin as Kodi does and calls the view
+SCRIPT = '''
+import sys
+sys.path[:0] = [{plugin_path!r}, {stubs_path!r}]
+import xbmc, xbmcgui, xbmcvfs, xbmcaddon, xbmcswift2.plugin
+sys.stderr.write({marker!r} + '\\n')
+sys.argv = ['plugin://plugin.video.amvnews/']
+import addon
+from constants import PLUGIN
+view = PLUGIN.views[{view!r}]
+if {args!r} is None:
+    import amvnews
+else:
+    view(*{args!r})
+'''
+
+
+def measure_imports(view, args):
+    """
+    Import the plugin and the modules imported by the view in a fresh interpreter.
+
+    :param str view: Name of the view.
+    :param list|None args: Arguments of the view.
+    :return: Total import time (milliseconds) and own import time of every module imported by the plugin.
+    :rtype: tuple(float, dict[str, float])
+    """
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', _get_script(view, args)],
+        stderr=subprocess.PIPE, universal_newlines=True, check=True, cwd=PLUGIN_PATH)
+
+    total, modules = 0, {}
+    lines = process.stderr.splitlines()
+    for line in lines[lines.index(MARKER) + 1:]:
+        fields = line[len('import time:'):].split('|')
+        if not line.startswith('import time:') or not fields[0].strip().isdigit():
+            continue
+        modules[fields[2].strip()] = int(fields[0]) / 1000.0
+        if not fields[2].startswith('  '):
+            # Nested imports are included to cumulative time of the top level ones
+            total += int(fields[1]) / 1000.0
+    return total, modules
+
+
+def find_heavy_modules(view, args):
+    """
+    Find heavy modules (of `HEAVY_MODULES`) imported by the view.
+
+    :param str view: Name of the view.
+    :param list|None args: Arguments of the view.
+    :rtype: list[str]
+    """
+    script = _get_script(view, args) + 'print("\\n".join(sys.modules))\n'
+    process = subprocess.run(
+        [sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, universal_newlines=True,
+        check=True, cwd=PLUGIN_PATH)
+    modules = set(process.stdout.split())
+    return sorted(name for name in HEAVY_MODULES if name in modules)
+
+
+def _get_script(view, args):
+    """
+    Get script which runs the view.
+
+    :param str view: Name of the view.
+    :param list|None args: Arguments of the view.
+    :rtype: str
+    """
+    return SCRIPT.format(plugin_path=PLUGIN_PATH, stubs_path=os.path.join(BENCHMARKS_PATH, 'stubs'), marker=MARKER,
+                         view=view, args=args)
+
+
+def main(repeats):
+    exceeded = False
+    print('{:<28} {:>10} {:>10}  {}'.format('route', 'import, ms', 'budget, ms', 'heaviest imports, ms'))
+    for view, args, budget in ROUTES:
+        results = [measure_imports(view, args) for _ in range(repeats)]
+        total = statistics.median(result[0] for result in results)
+        modules = min(results, key=lambda result: result[0])[1]
+        heaviest = sorted(modules.items(), key=lambda item: -item[1])[:TOP_IMPORTS]
+        print('{:<28} {:>10.1f} {:>10}  {}'.format(
+            view, total, budget or '-', ', '.join('{} {:.1f}'.format(name, value) for name, value in heaviest)))
+
+        if budget is not None:
+            heavy_modules = find_heavy_modules(view, args)
+            if heavy_modules:
+                print('  heavy modules are imported: {}'.format(', '.join(heavy_modules)))
+                exceeded = True
+            if total > budget:
+                print('  budget is exceeded')
+                exceeded = True
+    return 1 if exceeded else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 5))
@@ -0,0 +1,225 @@
+# coding=utf-8
+"""
+Benchmark and fuzz test of parsing of the file info tooltip and of the dates of AMV.
+
+Checks the parser on the corpus of saved tooltips (`fixtures/tooltips.json`) and compares its speed with the former
+regular expressions which scanned the whole tooltip once per field and backtracked. Then the parser is run on random
+mutations of the corpus, which must not fail, and on long adversarial inputs, where time must grow linearly.
+
+Usage: python benchmarks/bench_tooltips.py [number of mutations]
+"""
+import json
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import parsers  # noqa: E402
+from metadata import VideoInfo  # noqa: E402
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Fragments inserted by mutations, they make up tooltips and break them
+FRAGMENTS = [
+    u'<b>', u'</b>', u'<BR>', u'<br>', u':', u' ', u'.', u'/', u'@', u'x', u'х',
+    u'Размер', u'Длительность', u'Кодеки', u'Разрешение',
+    u'Мб', u'Гб', u'мин', u'сек', u'ч',
+    u'0', u'7', u'99', u'1920', u'23.976', u'в', u'(', u')',
+]
+
+# Lengths of adversarial inputs (characters)
+ADVERSARIAL_LENGTHS = [500, 1000, 2000, 4000]
+
+# Number of runs over the corpus per measurement, a single run is too short to be timed reliably
+CORPUS_RUNS = 200
+
+# Maximal ratio of parsing time of the longest adversarial input to the shortest one, lengths differ 8 times
+MAX_GROWTH = 8 * 3
+
+REGEX_AMV_SIZE = re.compile(u'^.*Размер</b>: ((?P<size>[\\d.]+) Мб)?.*$', re.S)
+REGEX_AMV_CODECS = re.compile(u'^.*Кодеки</b>: (?P<video>.+?)/(?P<audio>.+?)<BR>.*$', re.S)
+REGEX_AMV_RESOLUTION = re.compile(
+    u'^.*Разрешение</b>: (?P<width>\\d+)x(?P<height>\\d+)@(?P<fps>[\\d.]+).*$', re.S)
+REGEX_AMV_DURATION = re.compile(
+    u'^.*Длительность</b>: ((?P<min>\\d+) мин )?((?P<sec>\\d+) сек)?.*$', re.S)
+REGEX_AMV_AIRED = re.compile(u'^.*(?P<day>\\d{2})\\.(?P<month>\\d{2})\\.(?P<year>\\d{4}).*$', re.S)
+REGEX_AMV_ADDED = re.compile(
+    u'^.*(?P<day>\\d{2})\\.(?P<month>\\d{2})\\.(?P<year>\\d{4}).*(?P<hour>\\d{2}):(?P<minute>\\d{2}).*$', re.S)
+
+
+def legacy_parse_video(file_block):
+    """
+    Parse tooltip the way it was done before single pass parsing, frame rate wasn't kept.
+
+    :param str file_block: Tooltip of the link to the video file.
+    :rtype: VideoInfo
+    """
+    result = VideoInfo()
+    match = REGEX_AMV_DURATION.match(file_block)
+    if match:
+        minutes, seconds = match.group('min'), match.group('sec')
+        result.duration = int(minutes or 0) * 60 + int(seconds or 0)
+    match = REGEX_AMV_SIZE.match(file_block)
+    if match and match.group('size'):
+        result.size = int(float(match.group('size')) * 1024 * 1024)
+    match = REGEX_AMV_CODECS.match(file_block)
+    if match:
+        result.video_codec, result.audio_codec = match.group('video'), match.group('audio')
+    match = REGEX_AMV_RESOLUTION.match(file_block)
+    if match:
+        result.width, result.height = int(match.group('width')), int(match.group('height'))
+    return result
+
+
+def legacy_parse_dates(author_block, sender_block):
+    """
+    Parse dates the way it was done before single pass parsing.
+
+    :param str author_block: Text of the block with information about author.
+    :param str sender_block: Text of the block with information about sender.
+    :rtype: tuple(str, str)
+    """
+    aired, added = '', ''
+    match = REGEX_AMV_AIRED.match(author_block)
+    if match:
+        aired = '{year}-{month}-{day}'.format(**match.groupdict())
+    match = REGEX_AMV_ADDED.match(sender_block)
+    if match:
+        added = '{year}-{month}-{day} {hour}:{minute}:00'.format(**match.groupdict())
+    return aired, added
+
+
+def check_corpus(corpus):
+    """
+    Check the parser on the corpus, the former regular expressions are checked on tooltips they handled.
+
+    :param dict corpus: Saved tooltips and author/sender blocks with expected results.
+    """
+    for sample in corpus['video']:
+        expected = VideoInfo(**sample['expected'])
+        actual = parsers._parse_video_metadata(sample['tooltip'])
+        assert actual == expected, 'Parsing result differs for {!r}: {!r}'.format(sample['tooltip'], actual)
+        if sample['legacy']:
+            expected.fps = 0.0
+            actual = legacy_parse_video(sample['tooltip'])
+            assert actual == expected, 'Legacy parsing result differs for {!r}: {!r}'.format(sample['tooltip'], actual)
+
+    for sample in corpus['dates']:
+        expected = tuple(sample['expected'])
+        actual = parsers._parse_amv_date(sample['author'], sample['sender'])
+        assert actual == expected, 'Parsing result differs for {!r}: {!r}'.format(sample, actual)
+        if sample['legacy']:
+            actual = legacy_parse_dates(sample['author'], sample['sender'])
+            assert actual == expected, 'Legacy parsing result differs for {!r}: {!r}'.format(sample, actual)
+
+
+def mutate(text, rng):
+    """
+    Apply a few random mutations to the text: deletion, duplication or insertion of fragments.
+
+    :param str text: Text.
+    :param random.Random rng: Random generator.
+    :rtype: str
+    """
+    for _ in range(rng.randint(1, 8)):
+        start = rng.randint(0, len(text))
+        end = min(len(text), start + rng.randint(0, 16))
+        operation = rng.randrange(3)
+        if operation == 0:
+            text = text[:start] + text[end:]
+        elif operation == 1:
+            text = text[:start] + text[start:end] * rng.randint(2, 8) + text[start:]
+        else:
+            text = text[:start] + ''.join(rng.choice(FRAGMENTS) for _ in range(rng.randint(1, 4))) + text[start:]
+    return text
+
+
+def fuzz(corpus, mutations):
+    """
+    Run the parser on random mutations of the corpus, it must not fail and must return values of proper types.
+
+    :param dict corpus: Saved tooltips and author/sender blocks.
+    :param int mutations: Number of mutations.
+    """
+    rng = random.Random(0)
+    tooltips = [sample['tooltip'] for sample in corpus['video']]
+    blocks = [block for sample in corpus['dates'] for block in (sample['author'], sample['sender'])]
+    for _ in range(mutations):
+        tooltip = mutate(rng.choice(tooltips), rng)
+        result = parsers._parse_video_metadata(tooltip)
+        assert all(isinstance(value, int) and value >= 0 for value in
+                   (result.duration, result.size, result.width, result.height)), 'Bad result for {!r}'.format(tooltip)
+        assert isinstance(result.fps, float) and result.fps >= 0, 'Bad frame rate for {!r}'.format(tooltip)
+        assert '<' not in result.video_codec + result.audio_codec, 'Bad codecs for {!r}'.format(tooltip)
+
+        author, sender = mutate(rng.choice(blocks), rng), mutate(rng.choice(blocks), rng)
+        aired, added = parsers._parse_amv_date(author, sender)
+        assert len(aired) in (0, 10) and len(added) in (0, 19), 'Bad dates for {!r}, {!r}'.format(author, sender)
+
+
+def get_adversarial_inputs(length):
+    """
+    Get inputs which make backtracking regular expressions scan them repeatedly.
+
+    :param int length: Length of inputs (characters).
+    :return: Names and texts of inputs.
+    :rtype: list[tuple(str, str)]
+    """
+    return [
+        ('unterminated fields', (u'<b>Кодеки</b>: H.264/' * length)[:length]),
+        ('digits', u'<b>Длительность</b>: ' + u'1' * length),
+        ('dates without time', (u'01.01.2000 ' * length)[:length]),
+    ]
+
+
+def measure(function, runs=1):
+    """
+    Measure time of the function call, the best of 3 measurements is taken.
+
+    :param callable function: Measured function.
+    :param int runs: Number of calls per measurement.
+    :return: Time of a single call (milliseconds).
+    :rtype: float
+    """
+    return min(timeit.repeat(function, number=runs, repeat=3)) / runs * 1000
+
+
+def main(mutations):
+    with open(os.path.join(FIXTURES_PATH, 'tooltips.json'), encoding='utf-8') as fixture:
+        corpus = json.load(fixture)
+
+    check_corpus(corpus)
+    print('corpus: {} tooltips, {} date blocks are parsed correctly'.format(
+        len(corpus['video']), len(corpus['dates'])))
+
+    tooltips = [sample['tooltip'] for sample in corpus['video']]
+    legacy_time = measure(lambda: [legacy_parse_video(tooltip) for tooltip in tooltips], CORPUS_RUNS)
+    current_time = measure(lambda: [parsers._parse_video_metadata(tooltip) for tooltip in tooltips], CORPUS_RUNS)
+    print('corpus: legacy {:8.3f} ms   current {:8.3f} ms   speedup x{:.2f}'.format(
+        legacy_time, current_time, legacy_time / current_time))
+
+    fuzz(corpus, mutations)
+    print('fuzz: {} mutations are parsed without errors'.format(mutations))
+
+    failed = False
+    for index, (name, _) in enumerate(get_adversarial_inputs(0)):
+        legacy_times, current_times = [], []
+        for length in ADVERSARIAL_LENGTHS:
+            text = get_adversarial_inputs(length)[index][1]
+            legacy_times.append(measure(lambda: (legacy_parse_video(text), legacy_parse_dates(text, text))))
+            current_times.append(measure(lambda: (parsers._parse_video_metadata(text),
+                                                  parsers._parse_amv_date(text, text))))
+        print('{:<20} {}'.format(name, '   '.join(
+            '{}: legacy {:8.2f} ms current {:6.2f} ms'.format(length, legacy, current)
+            for length, legacy, current in zip(ADVERSARIAL_LENGTHS, legacy_times, current_times))))
+        if current_times[-1] > max(current_times[0], 0.1) * MAX_GROWTH:
+            print('  parsing time grows faster than length of input')
+            failed = True
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(int(sys.argv[1]) if len(sys.argv) > 1 else 20000))
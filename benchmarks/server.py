@@ -0,0 +1,243 @@
+# coding=utf-8
+"""
+Local stand-in for https://amvnews.ru which serves saved pages.
+
+The server imitates routing of index.php by its query parameters, authentication by cookie, conditional requests
+and redirects to downloaded files. Files are generated on the fly: video files have the size shown by AMV pages
+(sizes of the saved pages are replaced by `VIDEO_SIZE`), images and subtitles are small.
+
+Usage: python benchmarks/server.py [port]
+"""
+import hashlib
+import http.server
+import os
+import re
+import sys
+import threading
+import urllib.parse
+
+__all__ = ['start_server']
+
+FIXTURES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+# Size of generated files (bytes)
+VIDEO_SIZE = 256 * 1024
+IMAGE_SIZE = 8 * 1024
+
+# Identifier of AMV which page is used for AMV without saved page
+TEMPLATE_AMV_ID = 101
+
+# Listings are served for the first pages only, the next page is empty
+LISTING_PAGES = 1
+
+# AMV with greater identifiers don't exist, their pages have no metadata
+MAX_AMV_ID = 110
+
+# Page of missing AMV
+MISSING_AMV_PAGE = u'<html><body><div class="main">Файл не найден</div></body></html>'
+
+REGEX_LOGIN_FORM = re.compile(r'<form action="index.php\?go=Members".*?</form>', re.S)
+REGEX_VIDEO_SIZE = re.compile(r'(Размер</b>: )[\d.]+( Мб)')
+
+
+class AmvNewsHandler(http.server.BaseHTTPRequestHandler):
+    """
+    Handler of requests to the stand-in server.
+    """
+
+    protocol_version = 'HTTP/1.1'
+
+    # Number of handled requests, it is shared by all handlers
+    requests_count = 0
+    requests_lock = threading.Lock()
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):  # noqa: N802
+        self._count_request()
+        url = urllib.parse.urlsplit(self.path)
+        if url.path == '/index.php':
+            self._handle_index(dict(urllib.parse.parse_qsl(url.query)))
+        elif url.path.startswith('/files/') or url.path.startswith('/images/'):
+            self._send_file(url.path)
+        else:
+            self._send_body(404, b'Not found', 'text/plain')
+
+    def do_POST(self):  # noqa: N802
+        self._count_request()
+        self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        self.send_response(200)
+        self.send_header('Set-Cookie', 'PHPSESSID=benchmark; Path=/')
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _count_request(self):
+        with self.requests_lock:
+            AmvNewsHandler.requests_count += 1
+
+    def _handle_index(self, params):
+        """
+        Route request to index.php by its parameters.
+
+        :param dict params: Query parameters.
+        """
+        page = int(params.get('page', 0)) // 10
+        if params.get('file') == 'down':
+            if 'sub' in params:
+                self._send_redirect('/files/{}.srt'.format(params['sub']))
+            else:
+                self._send_redirect('/files/{}.mp4'.format(params['id']))
+        elif params.get('in') in ('ajaxreiting', 'addfav', 'delfav'):
+            self._send_body(200, b'OK', 'text/plain')
+        elif params.get('in') == 'view':
+            amv_id = int(params['id'])
+            self._send_page(_get_amv_page(amv_id) if amv_id <= MAX_AMV_ID else MISSING_AMV_PAGE)
+        elif params.get('go') == 'News':
+            self._send_page(_read_fixture('news_featured.html'))
+        elif params.get('file') in ('votes', 'favor'):
+            self._send_page(_read_fixture(
+                'files_{}.html'.format(params['file']) if page < LISTING_PAGES else 'files_empty.html'))
+        else:
+            self._send_body(404, b'Not found', 'text/plain')
+
+    def _send_page(self, text):
+        """
+        Send HTML page, the login form is shown to anonymous visitors only.
+
+        :param str text: HTML page.
+        """
+        if 'PHPSESSID=' in self.headers.get('Cookie', ''):
+            text = REGEX_LOGIN_FORM.sub('', text)
+        self._send_body(200, text.encode('utf-8'), 'text/html; charset=utf-8')
+
+    def _send_file(self, path):
+        """
+        Send generated file supporting range requests.
+
+        :param str path: Path to the file.
+        """
+        if path.endswith('.mp4'):
+            size = VIDEO_SIZE
+        elif path.endswith('.srt'):
+            size = 1024
+        else:
+            size = IMAGE_SIZE
+        body = _generate_content(path, size)
+
+        match = re.match(r'bytes=(\d+)-', self.headers.get('Range', ''))
+        if match and int(match.group(1)) < size:
+            offset = int(match.group(1))
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(offset, size - 1, size))
+            body = body[offset:]
+        elif match:
+            self._send_body(416, b'', 'text/plain')
+            return
+        else:
+            self.send_response(200)
+        self.send_header('Content-Type', 'application/octet-stream')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_redirect(self, location):
+        """
+        Redirect to another path of the server.
+
+        :param str location: Path to redirect to.
+        """
+        self.send_response(302)
+        self.send_header('Location', location)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def _send_body(self, status, body, content_type):
+        """
+        Send response answering conditional requests by 304.
+
+        :param int status: Status of the response.
+        :param bytes body: Body of the response.
+        :param str content_type: Content type of the body.
+        """
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        if status == 200:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def start_server(port=0):
+    """
+    Start the stand-in server in a background thread.
+
+    :param int port: Port to listen, a free port is chosen if it isn't specified.
+    :return: Server and its URL.
+    :rtype: tuple(http.server.ThreadingHTTPServer, str)
+    """
+    server = http.server.ThreadingHTTPServer(('127.0.0.1', port), AmvNewsHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    return server, 'http://127.0.0.1:{}'.format(server.server_address[1])
+
+
+def _read_fixture(filename):
+    """
+    Read saved page.
+
+    :param str filename: Name of the page file.
+    :return: HTML page.
+    :rtype: str
+    """
+    with open(os.path.join(FIXTURES_PATH, filename), encoding='utf-8') as f:
+        return f.read()
+
+
+def _get_amv_page(amv_id):
+    """
+    Get AMV page, pages of AMV which hasn't been saved are made of the page of `TEMPLATE_AMV_ID`.
+
+    :param int amv_id: Identifier of AMV.
+    :return: HTML page.
+    :rtype: str
+    """
+    filename = 'amv_view_{}.html'.format(amv_id)
+    if os.path.exists(os.path.join(FIXTURES_PATH, filename)):
+        text = _read_fixture(filename)
+    else:
+        text = _read_fixture('amv_view_{}.html'.format(TEMPLATE_AMV_ID)).replace(str(TEMPLATE_AMV_ID), str(amv_id))
+    return REGEX_VIDEO_SIZE.sub(r'\g<1>{:.2f}\g<2>'.format(VIDEO_SIZE / 1024.0 / 1024.0), text)
+
+
+def _generate_content(path, size):
+    """
+    Generate content of the file which is the same for every request.
+
+    :param str path: Path to the file.
+    :param int size: Size of the file.
+    :return: Content of the file.
+    :rtype: bytes
+    """
+    block = hashlib.sha256(path.encode('utf-8')).digest() * 128
+    return (block * (size // len(block) + 1))[:size]
+
+
+if __name__ == '__main__':
+    server, url = start_server(int(sys.argv[1]) if len(sys.argv) > 1 else 8080)
+    print('Serving {}/index.php'.format(url))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,36 @@
+# coding=utf-8
+"""
+Stand-in for Kodi `xbmc` module used by benchmarks.
+"""
+import os
+
+# Directory which `special://` paths are mapped to, it is assigned by the benchmark
+SPECIAL_PATH = os.path.join(os.path.abspath(os.sep), 'tmp', 'amvnews-bench')
+
+# Executed built-in functions
+executed_builtins = []
+
+
+def translatePath(path):  # noqa: N802
+    return path.replace('special://', SPECIAL_PATH + os.sep) if path.startswith('special://') else path
+
+
+def executebuiltin(function, wait=False):
+    executed_builtins.append(function)
+
+
+def getCondVisibility(condition):  # noqa: N802
+    return False
+
+
+def log(msg, level=0):
+    pass
+
+
+class Monitor(object):
+
+    def abortRequested(self):  # noqa: N802
+        return False
+
+    def waitForAbort(self, timeout=0):  # noqa: N802
+        return False
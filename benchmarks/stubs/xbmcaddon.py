@@ -0,0 +1,13 @@
+# coding=utf-8
+"""
+Stand-in for Kodi `xbmcaddon` module used by benchmarks.
+"""
+
+
+class Addon(object):
+
+    def __init__(self, addon_id=None):
+        pass
+
+    def getAddonInfo(self, key):  # noqa: N802
+        return {'id': 'plugin.video.amvnews', 'name': 'AmvNews'}.get(key, '')
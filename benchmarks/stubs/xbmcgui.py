@@ -0,0 +1,52 @@
+# coding=utf-8
+"""
+Stand-in for Kodi `xbmcgui` module used by benchmarks.
+"""
+
+NOTIFICATION_INFO = 'info'
+NOTIFICATION_WARNING = 'warning'
+NOTIFICATION_ERROR = 'error'
+
+
+class Dialog(object):
+
+    def ok(self, heading, message):
+        return True
+
+    def select(self, heading, options):
+        return len(options) - 1
+
+    def notification(self, heading, message, *args, **kwargs):
+        pass
+
+    def textviewer(self, heading, text, usemono=False):
+        pass
+
+
+class DialogProgressBG(object):
+
+    def create(self, heading, message=''):
+        pass
+
+    def update(self, percent=0, heading='', message=''):
+        pass
+
+    def close(self):
+        pass
+
+
+class Window(object):
+
+    _properties = {}
+
+    def __init__(self, window_id=0):
+        self._window_properties = self._properties.setdefault(window_id, {})
+
+    def getProperty(self, key):  # noqa: N802
+        return self._window_properties.get(key, '')
+
+    def setProperty(self, key, value):  # noqa: N802
+        self._window_properties[key] = value
+
+    def clearProperty(self, key):  # noqa: N802
+        self._window_properties.pop(key, None)
@@ -0,0 +1,5 @@
+# coding=utf-8
+"""
+Stand-in for xbmcswift2 framework used by benchmarks.
+"""
+from xbmcswift2.plugin import Plugin  # noqa: F401
@@ -0,0 +1,70 @@
+# coding=utf-8
+"""
+Stand-in for xbmcswift2 plugin which keeps settings and storages in memory.
+"""
+import logging
+import os
+import re
+
+# Settings of the plugin, they are assigned by the benchmark
+SETTINGS = {}
+
+# Profile directory of the plugin, it is assigned by the benchmark
+PROFILE_PATH = os.path.join(os.path.abspath(os.sep), 'tmp', 'amvnews-bench', 'profile')
+
+# Localized strings of the plugin
+STRINGS_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', '..', 'resources', 'language', 'English', 'strings.po')
+
+
+class Plugin(object):
+
+    name = 'AmvNews'
+
+    def __init__(self):
+        self.log = logging.getLogger('amvnews')
+        self.storages = {}
+        self.views = {}
+        with open(STRINGS_PATH, encoding='utf-8') as f:
+            self.strings = {
+                int(string_id): text for string_id, text in re.findall(r'msgctxt "#(\d+)"\nmsgid "(.*)"', f.read())}
+
+    @property
+    def storage_path(self):
+        if not os.path.isdir(PROFILE_PATH):
+            os.makedirs(PROFILE_PATH)
+        return PROFILE_PATH
+
+    def get_setting(self, key, converter=None):
+        value = SETTINGS.get(key, '')
+        if converter is bool:
+            return value == 'true'
+        return converter(value) if converter else value
+
+    def get_storage(self, name='main', **kwargs):
+        return self.storages.setdefault(name, {})
+
+    def get_string(self, string_id):
+        return self.strings[string_id]
+
+    def route(self, url_rule, name=None):
+        def decorator(view):
+            self.views[name or view.__name__] = view
+            return view
+        return decorator
+
+    def url_for(self, endpoint, **items):
+        return 'plugin://plugin.video.amvnews/{}?{}'.format(
+            endpoint, '&'.join('{}={}'.format(key, value) for key, value in sorted(items.items())))
+
+    def set_content(self, content):
+        pass
+
+    def finish(self, items=None, **kwargs):
+        return items
+
+    def set_resolved_url(self, item=None, subtitles=None):
+        pass
+
+    def run(self):
+        pass
@@ -0,0 +1,59 @@
+# coding=utf-8
+"""
+Stand-in for Kodi `xbmcvfs` module used by benchmarks. Paths are local paths.
+"""
+import os
+
+
+def exists(path):
+    return os.path.exists(path)
+
+
+def delete(path):
+    os.remove(path)
+    return True
+
+
+def rename(path, new_path):
+    os.replace(path, new_path)
+    return True
+
+
+def copy(path, new_path):
+    with open(path, 'rb') as src, open(new_path, 'wb') as dst:
+        dst.write(src.read())
+    return True
+
+
+def listdir(path):
+    names = os.listdir(path) if os.path.isdir(path) else []
+    dirs = [name for name in names if os.path.isdir(os.path.join(path, name))]
+    return dirs, [name for name in names if name not in dirs]
+
+
+class Stat(object):
+
+    def __init__(self, path):
+        self._stat = os.stat(path)
+
+    def st_size(self):
+        return self._stat.st_size
+
+    def st_mtime(self):
+        return int(self._stat.st_mtime)
+
+
+class File(object):
+
+    def __init__(self, path, mode='r'):
+        self._file = open(path, 'wb' if mode == 'w' else 'rb')
+
+    def write(self, buffer):
+        self._file.write(buffer)
+        return True
+
+    def readBytes(self, size=-1):  # noqa: N802
+        return bytearray(self._file.read(size))
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,609 @@
+# coding=utf-8
+"""
+Downloading of AMV files.
+"""
+import hashlib
+import io
+import os
+import threading
+import time
+import requests
+import urllib3
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from xml.etree import ElementTree as etree
+from constants import PLUGIN
+from stats import STATS
+from storage import DownloadManifest
+from urls import get_amv_url, get_subtitles_url
+import xbmc
+import xbmcvfs
+
+__all__ = ['DownloadManager', 'DownloadedFile', 'download_file', 'save_amv_extras', 'create_nfo_file',
+           'open_manifest', 'reconcile_manifest']
+
+# Interval between progress reports (seconds)
+PROGRESS_INTERVAL = 0.5
+
+# Bounds of the chunk size used to transfer files (bytes)
+MIN_CHUNK_SIZE = 64 * 1024
+MAX_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Chunk size grows while reading and writing of a chunk takes less time (seconds)
+TARGET_CHUNK_TIME = 0.25
+
+# Number of attempts to resume interrupted transfer
+TRANSFER_ATTEMPTS = 3
+
+# Number of queued tasks per worker after which adding of AMV waits for running tasks
+MAX_QUEUED_TASKS_PER_WORKER = 4
+
+# Saved file (checksum is None for files found in download folder which haven't been downloaded by the plugin,
+# modification time is None until the file is found in download folder by reconciliation)
+DownloadedFile = namedtuple('DownloadedFile', ['name', 'size', 'checksum', 'mtime'], defaults=(None,))
+
+
+class DownloadManager(object):
+    """
+    Pool of workers which downloads files of several AMV in parallel.
+
+    Video and subtitles are separate tasks, so files of the same AMV are downloaded in parallel too. Small files
+    (.nfo and artwork) of AMV are saved by a single task. AMV is recorded to the download manifest once all its
+    files are saved. Progress is tracked in bytes.
+
+    AMV may be added while previously added ones are being downloaded. Number of queued tasks is bounded, so adding
+    of AMV blocks until workers catch up and memory usage doesn't depend on number of AMV passed through the manager.
+    """
+
+    def __init__(self, browser, save_path, workers, progress=None):
+        """
+        :param AmvNewsBrowser browser: Browser to access AmvNews site.
+        :param str save_path: Local path where AMV will be saved.
+        :param int workers: Number of parallel transfers.
+        :param callable progress: Function accepting number of downloaded bytes, expected total number of bytes and
+            title of AMV being downloaded. It is called periodically from the thread which adds AMV and waits for them.
+        """
+        self.browser = browser
+        self.save_path = save_path
+        self.progress = progress
+        self.manifest = open_manifest(save_path)
+        workers = max(1, workers)
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._max_queued_tasks = workers * MAX_QUEUED_TASKS_PER_WORKER
+        self._futures = set()
+        self._lock = threading.Lock()
+        self._progress = {}
+        self._finished_bytes = 0
+        self._finished_total = 0
+        self._pending_tasks = {}
+        self._saved_files = {}
+        self._failed_amv_ids = set()
+        self._current_title = ''
+
+    def add(self, amv_info, subtitles_id=None):
+        """
+        Queue AMV to be downloaded unless it is already downloaded.
+
+        Method waits for running tasks if too many tasks are queued already.
+
+        :param AmvInfo amv_info: AMV metadata.
+        :param int|None subtitles_id: Identifier of AMV subtitles.
+        :return: Whether AMV is queued.
+        :rtype: bool
+        """
+        amv_id = amv_info.id
+        if amv_id in self._pending_tasks:
+            # AMV is already queued, e.g. it has moved to the next listing page while pages were crawled
+            return False
+        if amv_id in self.manifest:
+            # AMV is already downloaded
+            return False
+
+        artwork = list(zip(amv_info.images, ['%d-poster' % amv_id, '%d-fanart' % amv_id]))
+        files = [(get_amv_url(amv_id), str(amv_id), amv_info.video.size)]
+        if subtitles_id:
+            files.append((get_subtitles_url(subtitles_id), str(amv_id), 0))
+
+        with self._lock:
+            self._pending_tasks[amv_id] = len(files) + 1
+            self._saved_files[amv_id] = []
+            for url, filename, expected_size in files:
+                self._progress[(url, filename)] = [0, expected_size]
+        self._submit(amv_info, None, save_amv_extras, self.browser.http, self.save_path, amv_info, artwork)
+        for url, filename, _ in files:
+            progress = self._get_progress_callback((url, filename))
+            self._submit(amv_info, (url, filename), download_file,
+                         self.browser.http, url, self.save_path, filename, progress)
+
+        while len(self._futures) > self._max_queued_tasks:
+            self._wait_for_tasks()
+        return True
+
+    def wait(self):
+        """
+        Wait until all queued AMV are downloaded.
+
+        :return: Identifiers of AMV which haven't been downloaded due to errors.
+        :rtype: set[int]
+        """
+        while self._futures:
+            self._wait_for_tasks()
+        self._executor.shutdown()
+        return self._failed_amv_ids
+
+    def get_progress(self):
+        """
+        Get progress of downloading.
+
+        :return: Number of downloaded bytes, expected total number of bytes and title of AMV being downloaded.
+        :rtype: tuple(int, int, str)
+        """
+        with self._lock:
+            downloaded = self._finished_bytes + sum(task_progress[0] for task_progress in self._progress.values())
+            total = self._finished_total + sum(max(task_progress) for task_progress in self._progress.values())
+            return downloaded, total, self._current_title
+
+    def _wait_for_tasks(self):
+        """
+        Wait until any of queued tasks is finished or progress should be reported.
+        """
+        done, self._futures = wait(self._futures, timeout=PROGRESS_INTERVAL, return_when=FIRST_COMPLETED)
+        for future in done:
+            # Errors of tasks are handled by the tasks, so it is an error of the manager itself
+            if future.exception() is not None:
+                PLUGIN.log.error('Download task has failed: %s', future.exception())
+        if self.progress:
+            self.progress(*self.get_progress())
+
+    def _submit(self, amv_info, task_key, function, *args):
+        """
+        Queue task related to AMV.
+
+        :param AmvInfo amv_info: AMV metadata.
+        :param tuple|None task_key: Key of the task which progress is tracked.
+        :param callable function: Task function.
+        :param args: Task arguments.
+        """
+        self._futures.add(self._executor.submit(self._run_task, amv_info, task_key, function, *args))
+
+    def _run_task(self, amv_info, task_key, function, *args):
+        """
+        Execute task related to AMV and record AMV to the manifest if it was the last of its tasks.
+
+        :param AmvInfo amv_info: AMV metadata.
+        :param tuple|None task_key: Key of the task which progress is tracked.
+        :param callable function: Task function.
+        :param args: Task arguments.
+        """
+        amv_id = amv_info.id
+        self._current_title = amv_info.title
+        try:
+            saved_files = function(*args)
+            if isinstance(saved_files, DownloadedFile):
+                saved_files = [saved_files]
+            with self._lock:
+                self._saved_files[amv_id].extend(saved_files)
+        except Exception as e:
+            PLUGIN.log.error('Failed to download AMV %d: %s', amv_id, e)
+            with self._lock:
+                self._failed_amv_ids.add(amv_id)
+        finally:
+            with self._lock:
+                if task_key is not None:
+                    # Progress of finished tasks is accumulated to keep only running tasks in memory
+                    task_progress = self._progress.pop(task_key)
+                    self._finished_bytes += task_progress[0]
+                    self._finished_total += max(task_progress)
+                self._pending_tasks[amv_id] -= 1
+                completed = self._pending_tasks[amv_id] == 0 and amv_id not in self._failed_amv_ids
+                if self._pending_tasks[amv_id] == 0:
+                    del self._pending_tasks[amv_id]
+                    amv_files = self._saved_files.pop(amv_id)
+
+        if completed:
+            try:
+                self.manifest.put(amv_id, amv_files)
+            except Exception as e:
+                PLUGIN.log.error('Failed to record AMV %d to the download manifest: %s', amv_id, e)
+                with self._lock:
+                    self._failed_amv_ids.add(amv_id)
+
+    def _get_progress_callback(self, task_key):
+        """
+        Get function which tracks progress of file downloading.
+
+        :param tuple task_key: Key of the task.
+        :return: Function accepting number of downloaded bytes and size of the file.
+        :rtype: callable
+        """
+        def callback(downloaded, size):
+            with self._lock:
+                self._progress[task_key] = [downloaded, size or self._progress[task_key][1]]
+        return callback
+
+
+def save_amv_extras(client, save_path, amv_info, artwork):
+    """
+    Save .nfo file and artwork of AMV.
+
+    Files are small, so each of them is kept in memory and saved by a single write without a partial file. It saves
+    several operations on network shares per file.
+
+    :param HttpClient client: HTTP client.
+    :param str save_path: Local path where AMV will be saved.
+    :param AmvInfo amv_info: AMV information.
+    :param list[tuple(str, str)] artwork: URLs of images and filenames (without extension) assigned to them.
+    :return: Saved files.
+    :rtype: list[DownloadedFile]
+    """
+    saved_files = [create_nfo_file(save_path, amv_info)]
+    for url, filename in artwork:
+        response = client.get(url)
+        response.raise_for_status()
+        extension = response.url.rsplit('.', 1)[1]
+        saved_files.append(_write_file(save_path, '%s.%s' % (filename, extension), response.content))
+    return saved_files
+
+
+def create_nfo_file(save_path, amv_info):
+    """
+    Create .nfo file
+
+    :param str save_path: Local path where AMV will be saved.
+    :param AmvInfo amv_info: AMV information.
+    :return: Saved file.
+    :rtype: DownloadedFile
+    """
+    music_video = etree.Element('musicvideo')
+    etree.SubElement(music_video, 'title').text = amv_info.title
+    etree.SubElement(music_video, 'userrating').text = str(amv_info.user_rating * 2)
+    etree.SubElement(music_video, 'plot').text = amv_info.description
+    etree.SubElement(music_video, 'year').text = amv_info.aired.split('-')[0]
+    etree.SubElement(music_video, 'dateadded').text = amv_info.added
+    etree.SubElement(music_video, 'director').text = amv_info.author
+    etree.SubElement(music_video, 'playcount').text = '1'
+    for genre in amv_info.genre.split(','):
+        etree.SubElement(music_video, 'genre').text = genre.strip()
+
+    tree = etree.ElementTree(music_video)
+
+    content = io.BytesIO()
+    tree.write(content, encoding='utf-8', xml_declaration=True)
+    return _write_file(save_path, '%d.nfo' % amv_info.id, content.getvalue())
+
+
+def download_file(client, url, path, filename, progress=None):
+    """
+    Download file.
+
+    File is written to .part file which is renamed to the final name once it is complete. Interrupted transfer is
+    resumed by HTTP range requests, the partial file is kept open between attempts, so transfers to network shares
+    are resumed as well. Partial files left by previous plugin invocations are resumed only if the file is saved to
+    the local filesystem because Kodi can't append to files on network shares. Transfers are resumed after increasing
+    delays, so short outages of the server are survived. Error pages served instead of the file are rejected.
+
+    :param HttpClient client: HTTP client.
+    :param str url: URL of the file.
+    :param str path: Local path where file will be saved.
+    :param str filename: Filename to be assigned to the downloaded file.
+    :param callable progress: Function accepting number of downloaded bytes and size of the file (None if it is
+        unknown).
+    :return: Downloaded file.
+    :rtype: DownloadedFile
+    """
+    local_path = xbmc.translatePath(path)
+    is_local = '://' not in local_path and os.path.isdir(local_path)
+    part_filename = '%s.%s.part' % (filename, hashlib.md5(url.encode('utf-8')).hexdigest()[:8])
+    part_path = os.path.join(local_path if is_local else path, part_filename)
+    offset = _get_local_file_size(part_path) if is_local else 0
+    resumed_offset = offset
+    # Checksum is calculated while the file is written, resumed part is hashed before the rest is appended
+    checksum = _hash_file(part_path) if offset else hashlib.md5()
+    started = time.time()
+
+    f = _open_part_file(part_path, is_local, offset)
+    try:
+        for attempt in range(1, TRANSFER_ATTEMPTS + 1):
+            headers = {'Accept-Encoding': 'identity'}
+            if offset:
+                headers['Range'] = 'bytes=%d-' % offset
+            response = client.get(url, headers=headers, stream=True)
+            if response.status_code != 416:
+                response.raise_for_status()
+                if response.headers.get('Content-Type', '').startswith('text/html'):
+                    raise IOError('Page is served instead of {}'.format(url))
+            if offset and response.status_code != 206:
+                # Partial file doesn't match the remote one or the server doesn't support ranges, so it is rewritten
+                f.close()
+                offset = resumed_offset = 0
+                checksum = hashlib.md5()
+                f = _open_part_file(part_path, is_local, offset)
+                if response.status_code == 416:
+                    continue
+            size = _get_full_size(response, offset)
+
+            offset, error = _write_response(response, f, offset, size, progress, checksum)
+            if error is None:
+                if size is None or offset >= size:
+                    break
+                # Connection closed by the server before the end of the file doesn't raise errors with urllib3 1.x
+                error = IOError('Transfer of {} is interrupted at {} of {} bytes'.format(url, offset, size))
+            if attempt == TRANSFER_ATTEMPTS:
+                raise error
+            client.backoff(attempt)
+        else:
+            raise IOError('Failed to transfer {}'.format(url))
+    finally:
+        f.close()
+
+    elapsed = time.time() - started
+    STATS.record('download', elapsed * 1000)
+    STATS.record('download_speed', (offset - resumed_offset) / 1024.0 / max(elapsed, 0.001))
+    STATS.count('download_bytes', offset - resumed_offset)
+
+    if size is not None and offset != size:
+        raise IOError('Transfer of {} is incomplete: {} of {} bytes'.format(url, offset, size))
+
+    extension = response.url.rsplit('.', 1)[1]
+    filename = '%s.%s' % (filename, extension)
+    full_path = os.path.join(path, filename)
+
+    if is_local:
+        os.replace(part_path, os.path.join(local_path, filename))
+    else:
+        if xbmcvfs.exists(full_path):
+            xbmcvfs.delete(full_path)
+        if not xbmcvfs.rename(part_path, full_path):
+            raise IOError('Failed to rename {} to {}'.format(part_path, full_path))
+
+    return DownloadedFile(filename, offset, checksum.hexdigest())
+
+
+def open_manifest(save_path):
+    """
+    Open download manifest of the folder.
+
+    Manifest is rebuilt from content of the folder if it is opened for the first time, e.g. AMV have been
+    downloaded by former versions of the plugin.
+
+    :param str save_path: Local path where AMV are saved.
+    :return: Download manifest.
+    :rtype: DownloadManifest
+    """
+    manifest = DownloadManifest(os.path.join(PLUGIN.storage_path, 'downloads.db'), save_path)
+    if not manifest.initialized:
+        reconcile_manifest(manifest)
+    return manifest
+
+
+def reconcile_manifest(manifest):
+    """
+    Rebuild download manifest from content of the download folder.
+
+    AMV is considered downloaded if the folder contains its .nfo file and its video file or if the folder contains
+    .sync file left by former versions of the plugin. Extensions of video files are taken from the manifest, video is
+    the largest of files named by identifier of AMV. Checksums of found files aren't calculated to avoid reading of
+    the whole folder over the network. Only files which aren't recorded to the manifest are checked by stat if the
+    folder is a network share, sizes and modification times of files in the local folder come with the listing.
+    Sizes and checksums recorded by the plugin are kept for files which haven't changed. AMV which file has changed
+    its size since it was downloaded is considered broken.
+
+    :param DownloadManifest manifest: Manifest to be rebuilt.
+    :return: Number of AMV found in the folder.
+    :rtype: int
+    """
+    listed_files = _list_files(manifest.folder)
+    files = {}
+    for filename in listed_files:
+        name, _, extension = filename.partition('.')
+        amv_id = name.split('-', 1)[0]
+        if amv_id.isdigit() and extension and not extension.endswith('part'):
+            files.setdefault(int(amv_id), []).append(filename)
+
+    recorded_downloads = {
+        amv_id: {file_info[0]: DownloadedFile(*file_info) for file_info in amv_files}
+        for amv_id, amv_files in manifest.get_downloads().items()
+    }
+    video_extensions = {_get_video_extension(amv_id, recorded_files.values())
+                        for amv_id, recorded_files in recorded_downloads.items()}
+
+    downloads = {}
+    for amv_id, filenames in files.items():
+        # Subtitles are downloaded separately from video, so they don't prove that video has been downloaded
+        has_video = any(filename.startswith('%d.' % amv_id) and filename.rsplit('.', 1)[1].lower() in video_extensions
+                        for filename in filenames)
+        if '%d.sync' % amv_id not in filenames and ('%d.nfo' % amv_id not in filenames or not has_video):
+            continue
+
+        recorded_files = recorded_downloads.get(amv_id, {})
+        amv_files = []
+        for filename in sorted(filenames):
+            if filename.endswith('.sync'):
+                continue
+            recorded_file = recorded_files.get(filename)
+            size, mtime = listed_files[filename] or (None, None)
+            if size is None:
+                if recorded_file is not None and recorded_file.size is not None:
+                    # Recorded file is trusted to avoid stat over the network
+                    amv_files.append(recorded_file)
+                    continue
+                size, mtime = _get_file_stat(os.path.join(manifest.folder, filename))
+
+            if recorded_file is None or recorded_file.size is None:
+                amv_files.append(DownloadedFile(filename, size, None, mtime))
+            elif recorded_file.size != size:
+                PLUGIN.log.warning('Size of %s has changed since it was downloaded', filename)
+                break
+            elif recorded_file.mtime in (None, mtime):
+                amv_files.append(recorded_file._replace(mtime=mtime))
+            else:
+                # File is rewritten by content of the same size, so its recorded checksum is stale
+                amv_files.append(DownloadedFile(filename, size, None, mtime))
+        else:
+            downloads[amv_id] = amv_files
+    manifest.replace(downloads)
+    PLUGIN.log.info('Download manifest of %s is rebuilt, %d AMV are found', manifest.folder, len(downloads))
+    return len(downloads)
+
+
+def _write_file(path, filename, content):
+    """
+    Save content to the file by a single write.
+
+    :param str path: Local path where file will be saved.
+    :param str filename: Filename.
+    :param bytes content: Content of the file.
+    :return: Saved file.
+    :rtype: DownloadedFile
+    """
+    f = xbmcvfs.File(os.path.join(path, filename), 'w')
+    try:
+        if not f.write(bytearray(content)):
+            raise IOError('Failed to write {}'.format(os.path.join(path, filename)))
+    finally:
+        f.close()
+    return DownloadedFile(filename, len(content), hashlib.md5(content).hexdigest())
+
+
+def _open_part_file(part_path, is_local, offset):
+    """
+    Open the partial file for writing.
+
+    :param str part_path: Path to the partial file.
+    :param bool is_local: Whether the partial file is on the local filesystem.
+    :param int offset: Number of bytes already written to the partial file, they are kept if the file is local.
+    :return: Opened file.
+    """
+    if is_local:
+        return open(part_path, 'ab' if offset else 'wb')
+    return xbmcvfs.File(part_path, 'w')
+
+
+def _write_response(response, f, offset, size, progress, checksum):
+    """
+    Write body of the response to the partial file.
+
+    Body is read by chunks which grow while reading and writing a chunk takes less than `TARGET_CHUNK_TIME`.
+
+    :param requests.Response response: Streamed response.
+    :param f: Opened partial file.
+    :param int offset: Number of bytes already written to the partial file, body is appended to them.
+    :param int|None size: Full size of the file.
+    :param callable progress: Function accepting number of downloaded bytes and size of the file.
+    :param checksum: Hash object updated by written chunks.
+    :return: Number of bytes in the partial file and error which has interrupted the transfer (None if the body is
+        read to the end).
+    :rtype: tuple(int, Exception|None)
+    """
+    chunk_size = MIN_CHUNK_SIZE
+    try:
+        while True:
+            started = time.time()
+            chunk = response.raw.read(chunk_size, decode_content=True)
+            if not chunk:
+                return offset, None
+            f.write(chunk)
+            checksum.update(chunk)
+            offset += len(chunk)
+            if progress:
+                progress(offset, size)
+            if time.time() - started < TARGET_CHUNK_TIME:
+                chunk_size = min(chunk_size * 2, MAX_CHUNK_SIZE)
+    except (requests.RequestException, urllib3.exceptions.HTTPError) as e:
+        return offset, e
+
+
+def _get_full_size(response, offset):
+    """
+    Get full size of the file transferred by the response.
+
+    :param requests.Response response: Response.
+    :param int offset: Offset of the first transferred byte.
+    :return: Size of the file or None if it is unknown.
+    :rtype: int|None
+    """
+    if response.status_code == 206 and '/' in response.headers.get('Content-Range', ''):
+        total = response.headers['Content-Range'].rsplit('/', 1)[1]
+        if total.isdigit():
+            return int(total)
+    if 'Content-Length' in response.headers:
+        return offset + int(response.headers['Content-Length'])
+    return None
+
+
+def _get_local_file_size(path):
+    """
+    Get size of the file on the local filesystem.
+
+    :param str path: Path to the file.
+    :return: Size of the file or 0 if it doesn't exist.
+    :rtype: int
+    """
+    return os.path.getsize(path) if os.path.isfile(path) else 0
+
+
+def _list_files(path):
+    """
+    List files of the folder.
+
+    Sizes and modification times come with the listing only for the local filesystem, files on network shares are
+    listed by names because stat of every file is slow.
+
+    :param str path: Path to the folder.
+    :return: Sizes and modification times of files (None if they aren't listed) by filenames.
+    :rtype: dict[str, tuple(int, int)|None]
+    """
+    local_path = xbmc.translatePath(path)
+    if '://' not in local_path and os.path.isdir(local_path):
+        files = {}
+        for entry in os.scandir(local_path):
+            if entry.is_file():
+                stat = entry.stat()
+                files[entry.name] = (stat.st_size, int(stat.st_mtime))
+        return files
+    _, filenames = xbmcvfs.listdir(path)
+    return dict.fromkeys(filenames)
+
+
+def _get_file_stat(path):
+    """
+    Get size and modification time of the file in any location supported by Kodi.
+
+    :param str path: Path to the file.
+    :return: Size and modification time of the file.
+    :rtype: tuple(int, int)
+    """
+    stat = xbmcvfs.Stat(path)
+    return stat.st_size(), int(stat.st_mtime())
+
+
+def _get_video_extension(amv_id, files):
+    """
+    Get extension of the video file of downloaded AMV.
+
+    Video file is named by identifier of AMV like .nfo file and subtitles and it is the largest of them.
+
+    :param int amv_id: Identifier of AMV.
+    :param iterable[DownloadedFile] files: Files of AMV recorded to the manifest.
+    :return: Lowercase extension of the video file or None if it isn't recorded.
+    :rtype: str|None
+    """
+    named_files = [downloaded_file for downloaded_file in files
+                   if downloaded_file.name.startswith('%d.' % amv_id) and not downloaded_file.name.endswith('.nfo')]
+    if not named_files:
+        return None
+    return max(named_files, key=lambda downloaded_file: downloaded_file.size or 0).name.rsplit('.', 1)[1].lower()
+
+
+def _hash_file(path):
+    """
+    Calculate checksum of the file on the local filesystem.
+
+    :param str path: Path to the file.
+    :return: MD5 hash object of the file content.
+    """
+    checksum = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(MAX_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum
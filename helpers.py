@@ -4,7 +4,7 @@ Helpers.
 """
 from enum import Enum
 
-__all__ = ['Singleton', 'Language']
+__all__ = ['Singleton', 'Language', 'open_database']
 
 
 class Language(Enum):
@@ -27,3 +27,21 @@ class Singleton(type):
         if cls not in cls._instances:
             cls._instances[cls] = super(Singleton, cls).__call__(*args, **kwargs)
         return cls._instances[cls]
+
+
+def open_database(path):
+    """
+    Open SQLite database shared by several threads and plugin processes.
+
+    Connection works in autocommit mode, so each statement is a transaction unless one is started explicitly.
+    Access to the connection from several threads should be serialized by the caller.
+
+    :param str path: Path to the database file.
+    :return: Database connection.
+    :rtype: sqlite3.Connection
+    """
+    import sqlite3
+
+    connection = sqlite3.connect(path, timeout=10, check_same_thread=False, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    return connection
@@ -0,0 +1,114 @@
+# coding=utf-8
+"""
+On-disk cache of HTTP responses.
+"""
+import collections
+import threading
+import time
+import urllib.parse
+import zlib
+from helpers import open_database
+
+__all__ = ['HttpCache', 'CachedResponse']
+
+CachedResponse = collections.namedtuple('CachedResponse', ['text', 'etag', 'last_modified'])
+
+
+class HttpCache(object):
+    """
+    Size bounded LRU cache of HTTP responses revalidated by conditional requests.
+
+    Only responses having `ETag` or `Last-Modified` header are cached because there is no way to revalidate others.
+    Bodies are stored compressed.
+    """
+
+    def __init__(self, path, max_size):
+        """
+        :param str path: Path to the cache database.
+        :param int max_size: Maximal total size of stored bodies in bytes.
+        """
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS responses ('
+            'key TEXT PRIMARY KEY, etag TEXT, last_modified TEXT, body BLOB, size INTEGER, accessed REAL)'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS responses_accessed ON responses (accessed)')
+
+    @staticmethod
+    def get_key(url_params, scope=''):
+        """
+        Get cache key for specified URL params.
+
+        :param dict url_params: URL params.
+        :param str scope: Scope of the response, e.g. name of the authenticated user.
+        :return: Cache key.
+        :rtype: str
+        """
+        return '{}:{}'.format(scope, urllib.parse.urlencode(sorted((str(k), str(v)) for k, v in url_params.items())))
+
+    @staticmethod
+    def get_conditional_headers(cached_response):
+        """
+        Get headers of the request which revalidates cached response.
+
+        :param CachedResponse|None cached_response: Cached response.
+        :return: Request headers.
+        :rtype: dict
+        """
+        headers = {}
+        if cached_response is not None:
+            if cached_response.etag:
+                headers['If-None-Match'] = cached_response.etag
+            if cached_response.last_modified:
+                headers['If-Modified-Since'] = cached_response.last_modified
+        return headers
+
+    def get(self, key):
+        """
+        Get cached response and mark it as recently used.
+
+        :param str key: Cache key.
+        :return: Cached response or None if there is no such response.
+        :rtype: CachedResponse|None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT body, etag, last_modified FROM responses WHERE key = ?', (key,)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE responses SET accessed = ? WHERE key = ?', (time.time(), key))
+        return CachedResponse(zlib.decompress(row[0]).decode('utf-8'), row[1], row[2])
+
+    def put(self, key, response):
+        """
+        Store response if it can be revalidated later.
+
+        :param str key: Cache key.
+        :param requests.Response response: Response to store.
+        """
+        etag = response.headers.get('ETag')
+        last_modified = response.headers.get('Last-Modified')
+        if not etag and not last_modified:
+            return
+
+        body = zlib.compress(response.text.encode('utf-8'))
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO responses (key, etag, last_modified, body, size, accessed) '
+                'VALUES (?, ?, ?, ?, ?, ?)', (key, etag, last_modified, body, len(body), time.time()))
+            self._evict()
+
+    def _evict(self):
+        """
+        Remove least recently used responses exceeding the size limit.
+        """
+        total_size = 0
+        outdated_keys = []
+        for key, size in self._connection.execute('SELECT key, size FROM responses ORDER BY accessed DESC'):
+            total_size += size
+            if total_size > self.max_size:
+                outdated_keys.append((key,))
+        if outdated_keys:
+            self._connection.executemany('DELETE FROM responses WHERE key = ?', outdated_keys)
@@ -0,0 +1,117 @@
+# coding=utf-8
+"""
+HTTP client shared by all requests of the plugin.
+"""
+import time
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from storage import PRIORITY_INTERACTIVE
+
+__all__ = ['HttpClient', 'RETRY_STATUSES']
+
+# Statuses of responses which are retried
+RETRY_STATUSES = frozenset([500, 502, 503, 504])
+
+# Base delay of exponential backoff between retries (seconds), n-th retry waits BACKOFF_FACTOR * 2 ** (n - 1)
+BACKOFF_FACTOR = 0.5
+
+# Maximal delay between retries (seconds)
+MAX_BACKOFF = 10
+
+
+class HttpClient(object):
+    """
+    HTTP session with bounded pool of keep-alive connections, timeouts and retries.
+
+    Requests failed due to connection errors or server errors are retried with exponential backoff. All requests
+    share cookies of the session, so files are downloaded by the authenticated user too.
+
+    Requests wait for the rate limiter if it is given. They are made on behalf of the activity set by `priority`
+    attribute, e.g. the background service lowers it for prefetching and refreshing of outdated metadata.
+    """
+
+    def __init__(self, pool_size, connect_timeout, read_timeout, retries, limiter=None):
+        """
+        :param int pool_size: Maximal number of kept connections to a host.
+        :param float connect_timeout: Timeout of connection establishment (seconds).
+        :param float read_timeout: Timeout of waiting for data from the server (seconds).
+        :param int retries: Number of retries of failed requests.
+        :param RateLimiter|None limiter: Rate limiter of requests.
+        """
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.limiter = limiter
+        self.priority = PRIORITY_INTERACTIVE
+        self.session = requests.Session()
+        self.session.headers.update({
+            'User-Agent': 'AppleWebKit/537.36 (KHTML, like Gecko)',
+            'Accept-Encoding': 'gzip, deflate',
+        })
+        adapter = HTTPAdapter(pool_maxsize=max(1, pool_size), max_retries=_create_retry(retries))
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def get(self, url, limited=True, **kwargs):
+        """
+        Send GET request.
+
+        :param str url: URL.
+        :param bool limited: Whether the request waits for the rate limiter. Caller which measures time of the request
+            itself waits by `wait_for_turn` beforehand and passes False.
+        :param kwargs: Arguments of `requests.Session.get`.
+        :rtype: requests.Response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        if limited:
+            self.wait_for_turn()
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        """
+        Send POST request.
+
+        :param str url: URL.
+        :param kwargs: Arguments of `requests.Session.post`.
+        :rtype: requests.Response
+        """
+        kwargs.setdefault('timeout', self.timeout)
+        self.wait_for_turn()
+        return self.session.post(url, **kwargs)
+
+    @staticmethod
+    def backoff(attempt):
+        """
+        Wait before the next attempt of the operation which can't be retried by the session itself, e.g. reading of
+        streamed response interrupted by connection reset.
+
+        :param int attempt: Number of failed attempts.
+        """
+        time.sleep(min(BACKOFF_FACTOR * 2 ** (attempt - 1), MAX_BACKOFF))
+
+    def wait_for_turn(self):
+        """
+        Wait until the request is allowed by the rate limit.
+        """
+        if self.limiter:
+            self.limiter.acquire(self.priority)
+
+
+def _create_retry(retries):
+    """
+    Create retry policy of the session.
+
+    :param int retries: Number of retries.
+    :rtype: Retry
+    """
+    kwargs = {
+        'total': retries,
+        'backoff_factor': BACKOFF_FACTOR,
+        'status_forcelist': RETRY_STATUSES,
+        'raise_on_status': False,
+    }
+    try:
+        return Retry(allowed_methods=frozenset(['GET', 'HEAD']), **kwargs)
+    except TypeError:
+        # urllib3 < 1.26
+        return Retry(method_whitelist=frozenset(['GET', 'HEAD']), **kwargs)
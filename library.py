@@ -0,0 +1,56 @@
+# coding=utf-8
+"""
+Coalesced updates of Kodi video library.
+"""
+import time
+import xbmc
+import xbmcgui
+
+__all__ = ['request_library_update', 'run_requested_library_update']
+
+# Window which properties are shared by plugin invocations and the service
+HOME_WINDOW_ID = 10000
+
+# Properties of the home window which hold requested library update
+PROPERTY_UPDATE_PATH = 'plugin.video.amvnews.library_update.path'
+PROPERTY_UPDATE_TIME = 'plugin.video.amvnews.library_update.time'
+
+# Library is updated once no updates have been requested for this time (seconds)
+LIBRARY_UPDATE_DELAY = 10
+
+
+def request_library_update(path):
+    """
+    Request update of the video library for the folder.
+
+    The library isn't updated immediately. Requests made one after another are coalesced and the service updates
+    the library once when they stop.
+
+    :param str path: Folder to be scanned.
+    """
+    window = xbmcgui.Window(HOME_WINDOW_ID)
+    window.setProperty(PROPERTY_UPDATE_PATH, path)
+    window.setProperty(PROPERTY_UPDATE_TIME, str(time.time()))
+
+
+def run_requested_library_update():
+    """
+    Update the video library if it has been requested and no more requests have been made for a while.
+
+    :return: Whether the library update is started.
+    :rtype: bool
+    """
+    window = xbmcgui.Window(HOME_WINDOW_ID)
+    path = window.getProperty(PROPERTY_UPDATE_PATH)
+    if not path:
+        return False
+    if time.time() - float(window.getProperty(PROPERTY_UPDATE_TIME) or 0) < LIBRARY_UPDATE_DELAY:
+        return False
+    if xbmc.getCondVisibility('Library.IsScanningVideo'):
+        # Kodi ignores update requests while the library is being scanned
+        return False
+
+    window.clearProperty(PROPERTY_UPDATE_PATH)
+    window.clearProperty(PROPERTY_UPDATE_TIME)
+    xbmc.executebuiltin('UpdateLibrary(video,"{}")'.format(path))
+    return True
@@ -0,0 +1,305 @@
+# coding=utf-8
+"""
+Records of AMV metadata and their serialization.
+
+Records are serialized to JSON arrays of their fields in a fixed order, so stored metadata doesn't repeat field names.
+Every change of the order or of the set of fields gets a new `FORMAT_VERSION` and a migration from the previous
+formats, so metadata stored by older versions of the plugin is converted when it is read instead of being downloaded
+again. Version 4.1.0 and earlier kept metadata as dictionaries (format 5) in a storage of xbmcswift2, they are
+converted by `migrate_legacy_dict` once the storage is imported.
+"""
+import json
+from helpers import Language
+
+__all__ = ['AmvInfo', 'AmvSummary', 'VideoInfo', 'SubtitlesInfo', 'FORMAT_VERSION', 'serialize', 'deserialize',
+           'migrate_legacy_dict']
+
+# Version of the serialization format
+FORMAT_VERSION = 7
+
+# Version of metadata dictionaries kept by version 4.1.0 and earlier, dictionaries of older versions lack fields
+LEGACY_FORMAT_VERSION = 5
+
+
+class _Record(object):
+    """
+    Base of metadata records, records are compared and shown by their fields listed in `__slots__`.
+    """
+
+    __slots__ = ()
+
+    def __eq__(self, other):
+        return type(self) is type(other) and all(
+            getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __ne__(self, other):
+        return not self == other
+
+    def __repr__(self):
+        return '{}({})'.format(
+            type(self).__name__, ', '.join('{}={!r}'.format(name, getattr(self, name)) for name in self.__slots__))
+
+
+class VideoInfo(_Record):
+    """
+    Metadata of AMV video file.
+    """
+
+    __slots__ = ('duration', 'size', 'video_codec', 'audio_codec', 'width', 'height', 'fps')
+
+    def __init__(self, duration=0, size=0, video_codec='', audio_codec='', width=0, height=0, fps=0.0):
+        """
+        :param int duration: Duration (seconds).
+        :param int size: Size of the file (bytes).
+        :param str video_codec: Video codec.
+        :param str audio_codec: Audio codec.
+        :param int width: Width of video (pixels).
+        :param int height: Height of video (pixels).
+        :param float fps: Frame rate (0 if it is unknown).
+        """
+        self.duration = duration
+        self.size = size
+        self.video_codec = video_codec
+        self.audio_codec = audio_codec
+        self.width = width
+        self.height = height
+        self.fps = fps
+
+    @property
+    def aspect(self):
+        """
+        Aspect ratio of video (0 if resolution is unknown).
+
+        :rtype: float
+        """
+        return float(self.width) / self.height if self.height else 0.0
+
+    def pack(self):
+        """
+        Get fields of the record in the order of serialization.
+
+        :rtype: list
+        """
+        return [self.duration, self.size, self.video_codec, self.audio_codec, self.width, self.height, self.fps]
+
+    @classmethod
+    def unpack(cls, fields):
+        """
+        Create record from its serialized fields.
+
+        :param list fields: Fields in the order of serialization.
+        :rtype: VideoInfo
+        """
+        return cls(*fields)
+
+
+class SubtitlesInfo(_Record):
+    """
+    Metadata of AMV subtitles file.
+    """
+
+    __slots__ = ('id', 'language')
+
+    def __init__(self, subtitles_id, language):
+        """
+        :param int subtitles_id: Identifier of subtitles.
+        :param Language language: Language of subtitles.
+        """
+        self.id = subtitles_id
+        self.language = language
+
+    def pack(self):
+        """
+        Get fields of the record in the order of serialization.
+
+        :rtype: list
+        """
+        return [self.id, self.language.value]
+
+    @classmethod
+    def unpack(cls, fields):
+        """
+        Create record from its serialized fields.
+
+        :param list fields: Fields in the order of serialization.
+        :rtype: SubtitlesInfo
+        """
+        return cls(fields[0], Language(fields[1]))
+
+
+class AmvInfo(_Record):
+    """
+    Full metadata of AMV taken from AMV page.
+    """
+
+    __slots__ = (
+        'id', 'title', 'description', 'rating', 'votes', 'author', 'genre', 'aired', 'added', 'user_rating', 'video',
+        'subtitles', 'images', 'timestamp', 'date'
+    )
+
+    def __init__(self, amv_id, title, description='', rating=0.0, votes=0, author='', genre='', aired='', added='',
+                 user_rating=0.0, video=None, subtitles=None, images=None, timestamp=0.0):
+        """
+        :param int|None amv_id: Identifier of AMV.
+        :param str title: Title.
+        :param str description: Description.
+        :param float rating: Rating on the site (from 0 to 5).
+        :param int votes: Number of votes.
+        :param str author: Author.
+        :param str genre: Genres separated by comma.
+        :param str aired: Date when AMV was aired (YYYY-MM-DD or empty string).
+        :param str added: Time when AMV was added to the site (YYYY-MM-DD hh:mm:ss or empty string).
+        :param float user_rating: Mark given by the user (0 if AMV isn't evaluated).
+        :param VideoInfo|None video: Metadata of video file.
+        :param list[SubtitlesInfo]|None subtitles: Metadata of subtitles files.
+        :param list[str]|None images: URLs of poster and screenshots.
+        :param float timestamp: Time when metadata was obtained (seconds since epoch).
+        """
+        self.id = amv_id
+        self.title = title
+        self.description = description
+        self.rating = rating
+        self.votes = votes
+        self.author = author
+        self.genre = genre
+        self.aired = aired
+        self.added = added
+        self.user_rating = user_rating
+        self.video = video or VideoInfo()
+        self.subtitles = subtitles or []
+        self.images = images or []
+        self.timestamp = timestamp
+        # Date of the news featuring AMV, it is known for featured AMV only and isn't stored
+        self.date = None
+
+    @property
+    def image(self):
+        """
+        URL of the poster (None if AMV has no images).
+
+        :rtype: str|None
+        """
+        return self.images[0] if self.images else None
+
+    def pack(self):
+        """
+        Get fields of the record in the order of serialization, identifier isn't included.
+
+        :rtype: list
+        """
+        return [
+            self.title, self.description, self.rating, self.votes, self.author, self.genre, self.aired, self.added,
+            self.user_rating, self.video.pack(), [subtitles.pack() for subtitles in self.subtitles], self.images,
+            self.timestamp
+        ]
+
+    @classmethod
+    def unpack(cls, amv_id, fields):
+        """
+        Create record from its serialized fields.
+
+        :param int amv_id: Identifier of AMV.
+        :param list fields: Fields in the order of serialization.
+        :rtype: AmvInfo
+        """
+        return cls(
+            amv_id, *fields[:9], video=VideoInfo.unpack(fields[9]),
+            subtitles=[SubtitlesInfo.unpack(subtitles) for subtitles in fields[10]], images=fields[11],
+            timestamp=fields[12])
+
+    @classmethod
+    def from_dict(cls, metadata):
+        """
+        Create record from metadata dictionary used by version 4.1.0 and earlier of the plugin (format 5).
+
+        :param dict metadata: AMV metadata.
+        :rtype: AmvInfo
+        """
+        amv, video = metadata['amv'], metadata['video']
+        timestamp = metadata.get('timestamp')
+        return cls(
+            metadata.get('id'), amv['title'], amv['description'], amv['rating'], amv['votes'], amv['author'],
+            amv['genre'], amv['aired'], amv['added'], amv['user_rating'],
+            VideoInfo(video['duration'], video['size'], video['video_codec'], video['audio_codec'], video['width'],
+                      video['height']),
+            [SubtitlesInfo(subtitles_id, language) for language, subtitles_id in metadata['subtitles']],
+            metadata['images'], timestamp.timestamp() if timestamp else 0.0)
+
+
+class AmvSummary(_Record):
+    """
+    Summary metadata of AMV taken from the list of news.
+    """
+
+    __slots__ = ('id', 'title', 'date', 'image')
+
+    def __init__(self, amv_id, title, date, image):
+        """
+        :param int amv_id: Identifier of AMV.
+        :param str title: Title.
+        :param str date: Date of the news.
+        :param str|None image: URL of the poster.
+        """
+        self.id = amv_id
+        self.title = title
+        self.date = date
+        self.image = image
+
+
+def serialize(amv_info):
+    """
+    Serialize AMV metadata in the current format.
+
+    :param AmvInfo amv_info: AMV metadata.
+    :return: Serialized metadata.
+    :rtype: bytes
+    """
+    return json.dumps(amv_info.pack(), ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def deserialize(amv_id, format_version, data):
+    """
+    Deserialize AMV metadata stored in the current or one of the previous formats.
+
+    :param int amv_id: Identifier of AMV.
+    :param int format_version: Format of the serialized metadata.
+    :param bytes data: Serialized metadata.
+    :return: AMV metadata or None if its format can't be migrated.
+    :rtype: AmvInfo|None
+    """
+    if format_version == FORMAT_VERSION:
+        return AmvInfo.unpack(amv_id, json.loads(data.decode('utf-8')))
+    migration = MIGRATIONS.get(format_version)
+    return migration(amv_id, data) if migration else None
+
+
+def migrate_legacy_dict(metadata):
+    """
+    Convert metadata dictionary kept by version 4.1.0 and earlier of the plugin.
+
+    :param dict metadata: AMV metadata.
+    :return: AMV metadata or None if its format can't be migrated.
+    :rtype: AmvInfo|None
+    """
+    if not isinstance(metadata, dict) or metadata.get('format') != LEGACY_FORMAT_VERSION:
+        return None
+    return AmvInfo.from_dict(metadata)
+
+
+def _migrate_format_6(amv_id, data):
+    """
+    Convert metadata stored without frame rate (format 6), frame rate is left unknown until metadata is refreshed.
+
+    :param int amv_id: Identifier of AMV.
+    :param bytes data: Serialized metadata.
+    :rtype: AmvInfo
+    """
+    fields = json.loads(data.decode('utf-8'))
+    fields[9].append(0.0)
+    return AmvInfo.unpack(amv_id, fields)
+
+
+# Migrations of the previous formats by their versions
+MIGRATIONS = {
+    6: _migrate_format_6,
+}
@@ -0,0 +1,283 @@
+# coding=utf-8
+"""
+Parsers of HTML pages generated by https://amvnews.ru.
+"""
+import re
+from bs4 import BeautifulSoup, SoupStrainer
+from helpers import Language
+from metadata import AmvInfo, AmvSummary, SubtitlesInfo, VideoInfo
+from urls import get_absolute_url
+
+try:
+    import lxml  # noqa: F401
+    HTML_PARSER = 'lxml'
+except ImportError:
+    HTML_PARSER = 'html.parser'
+
+try:
+    from bs4.filter import ElementFilter
+except ImportError:
+    # BeautifulSoup < 4.13
+    ElementFilter = None
+
+__all__ = [
+    'DETAIL_PAGE_FILTER', 'RATESTOP_FILTER',
+    'parse_html', 'parse_featured_summaries', 'parse_amv_ids', 'parse_amv_page'
+]
+
+# Identifiers of the blocks of AMV page which contain metadata
+DETAIL_PAGE_BLOCK_IDS = frozenset(['author-block', 'sender-block', 'vote-text', 'main-link-block', 'subtitles-block'])
+
+
+def _is_detail_page_tag(name, attrs):
+    """
+    Check whether tag of AMV page may contain metadata.
+
+    :param str name: Tag name.
+    :param dict attrs: Tag attributes.
+    :rtype: bool
+    """
+    return name == 'img' or 'itemprop' in attrs or attrs.get('id') in DETAIL_PAGE_BLOCK_IDS
+
+
+if ElementFilter is not None:
+    class _DetailPageFilter(ElementFilter):
+        """
+        Filter which leaves only tags of AMV page which may contain metadata.
+        """
+
+        def allow_tag_creation(self, nsprefix, name, attrs):
+            return _is_detail_page_tag(name, attrs or {})
+
+        def allow_string_creation(self, string):
+            return False
+
+    DETAIL_PAGE_FILTER = _DetailPageFilter()
+else:
+    DETAIL_PAGE_FILTER = SoupStrainer(_is_detail_page_tag)
+
+RATESTOP_FILTER = SoupStrainer('a', attrs={'class': 'ratestop'})
+
+
+def parse_html(text, parse_only=None):
+    """
+    Parse HTML page.
+
+    :param str text: HTML page.
+    :param parse_only: Filter of tags to be parsed, the whole page is parsed if it isn't specified.
+    :return: Parsed HTML page.
+    :rtype: BeautifulSoup
+    """
+    return BeautifulSoup(text.replace('&#...', '...'), HTML_PARSER, parse_only=parse_only)
+
+
+def parse_featured_summaries(html):
+    """
+    Get summary metadata of AMV listed on featured AMV page.
+
+    :param BeautifulSoup html: Parsed HTML page.
+    :return: Summary metadata of AMV.
+    :rtype: list[AmvSummary]
+    """
+    result = []
+    for node in html.find_all('span', attrs={'class': 'newstitle'}):
+        news_block = node.find_parent('table').find_next_sibling('table')
+        amv_link = news_block.find('a', attrs={'class': 'more-news-simple-a'}).attrs['href']
+        image_tag = news_block.find('img')
+        result.append(AmvSummary(
+            int(REGEX_AMV_ID.match(amv_link).groupdict()['id']),
+            node.text.strip(),
+            node.find_parent('td').find_next_sibling('td').text.strip(),
+            get_absolute_url(image_tag.attrs['src']) if image_tag else None,
+        ))
+    return result
+
+
+def parse_amv_ids(html):
+    """
+    Get identifiers of AMV listed on evaluated or favourite AMV page.
+
+    :param BeautifulSoup html: Parsed HTML page.
+    :return: Identifiers of AMV.
+    :rtype: list[int]
+    """
+    return [
+        int(REGEX_AMV_ID.match(node.attrs['href']).groupdict()['id'])
+        for node in html.find_all('a', attrs={'class': 'ratestop'})[:10]
+    ]
+
+
+def parse_amv_page(html):
+    """
+    Get AMV metadata from AMV page.
+
+    All tags holding metadata are collected by a single pass over the page, so the page may be parsed with
+    `DETAIL_PAGE_FILTER` to skip everything else.
+
+    :param BeautifulSoup html: Parsed HTML page.
+    :return: AMV metadata without identifier and timestamp.
+    :rtype: AmvInfo
+    """
+    tags, genres, image_tags = {}, [], []
+    for tag in html.find_all(True):
+        itemprop = tag.attrs.get('itemprop')
+        if itemprop == 'name':
+            tags.setdefault('{}-name'.format(tag.name), tag)
+        elif itemprop == 'genre':
+            genres.append(tag.attrs['content'])
+        elif itemprop:
+            tags.setdefault(itemprop, tag)
+
+        tag_id = tag.attrs.get('id')
+        if tag_id in DETAIL_PAGE_BLOCK_IDS:
+            tags.setdefault(tag_id, tag)
+
+        if tag.name == 'img':
+            image_tags.append(tag)
+
+    title = tags.get('h1-name').text.strip()
+    user_rating = tags['vote-text'].text.strip() if 'vote-text' in tags else '-'
+    aired, added = _parse_amv_date(tags.get('author-block').text, tags.get('sender-block').text)
+
+    return AmvInfo(
+        None,
+        title=title,
+        description=tags.get('description').text.strip(),
+        rating=float(tags.get('ratingValue').text.strip()),
+        votes=int(tags.get('ratingCount').text.strip()),
+        author=tags.get('span-name').text.strip(),
+        genre=', '.join(genres),
+        aired=aired,
+        added=added,
+        user_rating=float(0 if user_rating == '-' else user_rating),
+        video=_parse_video_metadata(tags.get('main-link-block').find('a').attrs['onmouseover']),
+        subtitles=_parse_subtitles_metadata(tags.get('subtitles-block')),
+        images=_parse_images(tags.get('image'), image_tags, title),
+    )
+
+
+def _parse_amv_date(author_block, sender_block):
+    """
+    Get information when AMV was aired and when AMV was added to the site.
+
+    The last date of the block is taken, time is required for the date when AMV was added.
+
+    :param str author_block: Text of the block with information about author.
+    :param str sender_block: Text of the block with information about sender.
+    :return: Dates when AMV was aired and when AMV was added to the site.
+    :rtype: tuple(str, str)
+    """
+    aired = ''
+    dates = REGEX_DATE.findall(author_block)
+    if dates:
+        day, month, year = dates[-1][:3]
+        aired = '{}-{}-{}'.format(year, month, day)
+
+    added = ''
+    dates = [date for date in REGEX_DATE.findall(sender_block) if date[3]]
+    if dates:
+        day, month, year, hour, minute = dates[-1]
+        added = '{}-{}-{} {}:{}:00'.format(year, month, day, hour, minute)
+
+    return aired, added
+
+
+def _parse_images(main_image_tag, image_tags, title):
+    """
+    Get AMV related images/screenshots.
+
+    :param bs4.Tag|None main_image_tag: Tag of the main image.
+    :param list[bs4.Tag] image_tags: All image tags of the page.
+    :param str title: AMV title.
+    :return: List of image's URL
+    :rtype: list[str]
+    """
+    images = []
+    image_alts = [title]
+    if main_image_tag:
+        images.append(get_absolute_url(main_image_tag.attrs['src']))
+        image_alts.append(main_image_tag.attrs['alt'])
+
+    for image_tag in image_tags:
+        if image_tag.attrs.get('alt') in image_alts:
+            image_url = get_absolute_url(image_tag.attrs['src'])
+            if image_url not in images:
+                images.append(image_url)
+
+    return images
+
+
+def _parse_video_metadata(file_block):
+    """
+    Get information about video file.
+
+    The tooltip is scanned once, every known field is matched together with its value and dispatched by the groups
+    of the value. Unknown fields and values which can't be parsed are skipped.
+
+    :param str file_block: Tooltip of the link to the video file.
+    :return: Video file metadata.
+    :rtype: VideoInfo
+    """
+    duration = size = width = height = 0
+    video_codec = audio_codec = ''
+    fps = 0.0
+    for number, unit, hours, minutes, seconds, video, audio, width_value, height_value, frame_rate in \
+            REGEX_TOOLTIP_FIELD.findall(file_block):
+        if number:
+            size = int(float(number) * SIZE_UNITS.get(unit, 0))
+        elif video:
+            video_codec, audio_codec = video, audio.rstrip()
+        elif width_value:
+            width, height = int(width_value), int(height_value)
+            if frame_rate:
+                fps = float(frame_rate)
+        else:
+            # Duration is the only field which may have no value groups
+            duration = int(seconds or 0)
+            if minutes:
+                duration += int(minutes) * 60
+            if hours:
+                duration += int(hours) * 3600
+    return VideoInfo(duration, size, video_codec, audio_codec, width, height, fps)
+
+
+def _parse_subtitles_metadata(subtitles_block):
+    """
+    Get information about subtitles files.
+
+    :param bs4.Tag|None subtitles_block: Block with links to subtitles.
+    :return: Subtitles files metadata.
+    :rtype: list[SubtitlesInfo]
+    """
+    subtitles = []
+    if subtitles_block:
+        for subtitles_info in subtitles_block.find_all('a'):
+            subtitles_id = int(REGEX_AMV_SUB_ID.match(subtitles_info.attrs['href']).groupdict()['id'])
+            if u'английский' in subtitles_info.attrs['onmouseover']:
+                subtitles_lang = Language.English
+            elif u'русский' in subtitles_info.attrs['onmouseover']:
+                subtitles_lang = Language.Russian
+            else:
+                subtitles_lang = Language.Unknown
+            subtitles.append(SubtitlesInfo(subtitles_id, subtitles_lang))
+    return subtitles
+
+
+REGEX_AMV_ID = re.compile(u'^.*id=(?P<id>\\d+).*$', re.S)
+REGEX_AMV_SUB_ID = re.compile(u'^.*sub=(?P<id>\\d+).*$', re.S)
+
+# Field of the tooltip of the link to the video file with its value (<b>name</b>: value<BR>), fields are: size of
+# the file (123.45 Мб), duration (1 ч 3 мин 25 сек, any of parts may be omitted), codecs of video and audio
+# (H.264/AAC), resolution and optional frame rate (1920x1080@23.976). Length of numbers is limited, so they never
+# overflow
+REGEX_TOOLTIP_FIELD = re.compile(
+    u'<b>(?:Размер</b>:\\s*(\\d{1,9}(?:\\.\\d{1,6})?)\\s*([^\\d\\s<]*)'
+    u'|Длительность</b>:\\s*(?:(\\d{1,9})\\s*ч\\s*)?(?:(\\d{1,9})\\s*мин\\s*)?'
+    u'(?:(\\d{1,9})\\s*сек)?'
+    u'|Кодеки</b>:\\s*([^/<]+)/([^<]*)'
+    u'|Разрешение</b>:\\s*(\\d{1,5})[xх](\\d{1,5})(?:@(\\d{1,3}(?:\\.\\d{1,3})?))?)')
+# Date and optional time: 21.03.2019 в 18:45
+REGEX_DATE = re.compile(u'(\\d{2})\\.(\\d{2})\\.(\\d{4})(?:\\D{0,16}?(\\d{2}):(\\d{2}))?')
+
+# Units of size of the video file (bytes)
+SIZE_UNITS = {u'Кб': 1024, u'Мб': 1024 * 1024, u'Гб': 1024 * 1024 * 1024}
@@ -0,0 +1,140 @@
+# coding=utf-8
+"""
+Rate limit of requests to the site shared by all plugin processes.
+"""
+import heapq
+import itertools
+import os
+import threading
+import time
+from stats import STATS
+from storage import PRIORITY_INTERACTIVE
+
+try:
+    import fcntl
+    msvcrt = None
+except ImportError:
+    # Windows
+    fcntl = None
+    import msvcrt
+
+__all__ = ['RateLimiter']
+
+# Requests made at once after a pause are limited by the number of requests allowed for this time (seconds)
+BURST_DURATION = 2
+
+# Share of the burst which is reserved for interactive requests, requests of lower priorities leave it in the bucket
+INTERACTIVE_RESERVE = 0.5
+
+
+class RateLimiter(object):
+    """
+    Token bucket which limits rate of requests.
+
+    State of the bucket is kept in a lock file, so the limit holds for all processes Kodi runs at once (plugin
+    invocations and the background service). Within a process requests wait in order of their priority. Across
+    processes interactive requests go ahead because requests of lower priorities never take the reserved tokens.
+    """
+
+    def __init__(self, path, rate):
+        """
+        :param str path: Path to the lock file.
+        :param float rate: Maximal number of requests per second.
+        """
+        self.rate = float(rate)
+        self.capacity = max(1.0, self.rate * BURST_DURATION)
+        self._condition = threading.Condition()
+        self._waiting = []
+        self._counter = itertools.count()
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o644), 'r+b')
+        self._fd = self._file.fileno()
+
+    def acquire(self, priority=PRIORITY_INTERACTIVE):
+        """
+        Wait until request is allowed by the limit.
+
+        :param int priority: Priority of the request (PRIORITY_INTERACTIVE, PRIORITY_PREFETCH or PRIORITY_BACKGROUND).
+        """
+        started = time.time()
+        with self._condition:
+            ticket = (-priority, next(self._counter))
+            heapq.heappush(self._waiting, ticket)
+            try:
+                while True:
+                    delay = self._take_token(priority) if self._waiting[0] == ticket else None
+                    if delay == 0:
+                        break
+                    self._condition.wait(delay)
+            finally:
+                self._waiting.remove(ticket)
+                heapq.heapify(self._waiting)
+                self._condition.notify_all()
+
+        waited = time.time() - started
+        if waited > 0.001:
+            STATS.record('throttle', waited * 1000)
+
+    def _take_token(self, priority):
+        """
+        Take token from the bucket.
+
+        :param int priority: Priority of the request.
+        :return: Time to wait for the token if the bucket doesn't have it (seconds), 0 if the token is taken.
+        :rtype: float
+        """
+        needed = 1 + (self.capacity * INTERACTIVE_RESERVE if priority < PRIORITY_INTERACTIVE else 0)
+        _lock_file(self._fd)
+        try:
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            state = os.read(self._fd, 64).split()
+            now = time.time()
+            if len(state) == 2:
+                tokens, timestamp = float(state[0]), float(state[1])
+                tokens = min(self.capacity, tokens + max(0.0, now - timestamp) * self.rate)
+            else:
+                tokens = self.capacity
+
+            delay = 0
+            if tokens >= needed:
+                tokens -= 1
+            else:
+                delay = (needed - tokens) / self.rate
+
+            os.lseek(self._fd, 0, os.SEEK_SET)
+            os.write(self._fd, '{:.3f} {:.3f}'.format(tokens, now).encode('ascii'))
+            os.ftruncate(self._fd, os.lseek(self._fd, 0, os.SEEK_CUR))
+        finally:
+            _unlock_file(self._fd)
+        return delay
+
+
+def _lock_file(fd):
+    """
+    Lock file exclusively, wait until it is unlocked by other processes.
+
+    :param int fd: File descriptor.
+    """
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        return
+    os.lseek(fd, 0, os.SEEK_SET)
+    while True:
+        try:
+            msvcrt.locking(fd, msvcrt.LK_LOCK, 1)
+            return
+        except OSError:
+            # LK_LOCK gives up after 10 seconds
+            pass
+
+
+def _unlock_file(fd):
+    """
+    Unlock file locked by `_lock_file`.
+
+    :param int fd: File descriptor.
+    """
+    if fcntl:
+        fcntl.flock(fd, fcntl.LOCK_UN)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        msvcrt.locking(fd, msvcrt.LK_UNLCK, 1)
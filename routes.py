@@ -1,12 +1,17 @@
 # coding=utf-8
 """
 Routing rules.
+
+Kodi starts a new process for every plugin invocation. Modules which load HTTP and HTML parsing libraries are
+imported only by the routes which access the site, so menus and playback which only build URLs start fast.
 """
 import xbmc
 import xbmcgui
-from amvnews import AmvNewsBrowser
 from constants import PLUGIN
 from helpers import Language
+from library import request_library_update
+from metadata import AmvSummary
+from urls import get_amv_url, get_subtitles_url
 
 
 @PLUGIN.route('/')
@@ -37,6 +42,13 @@ def create_main_listing():
             'thumbnail': None,
             'context_menu': [],
             'path': PLUGIN.url_for('create_favourite_amv_list', page=0)
+        },
+        {
+            'label': PLUGIN.get_string(10018),
+            'icon': None,
+            'thumbnail': None,
+            'context_menu': [],
+            'path': PLUGIN.url_for('search')
         }
     ]
     PLUGIN.set_content('videos')
@@ -63,18 +75,23 @@ def create_featured_amv_list(page):
     items = []
     if page > 1:
         items.append(_create_prev_page_item('create_featured_amv_list', page))
-    for amv in AmvNewsBrowser().get_featured_amv_list(page):
+    browser = _get_browser()
+    for amv in browser.get_featured_amv_list(page):
         context_menu = []
         if PLUGIN.get_setting('username') and PLUGIN.get_setting('password'):
             context_menu.extend([
-                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv['id'])),
-                (PLUGIN.get_string(10005), 'RunPlugin(%s)' % PLUGIN.url_for('add_to_favourites', amv_id=amv['id'])),
-                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv['id'])),
+                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv.id)),
+                (PLUGIN.get_string(10005), 'RunPlugin(%s)' % PLUGIN.url_for('add_to_favourites', amv_id=amv.id)),
+                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv.id)),
             ])
-        item = _create_amv_item(amv, context_menu)
-        item['label'] = u'{} ({})'.format(amv['amv']['title'], amv['amv']['date'])
+        if isinstance(amv, AmvSummary):
+            item = _create_amv_summary_item(amv, context_menu)
+        else:
+            item = _create_amv_item(amv, context_menu)
+        item['label'] = u'{} ({})'.format(amv.title, amv.date)
         items.append(item)
     items.append(_create_next_page_item('create_featured_amv_list', page))
+    browser.schedule_prefetch('featured', page + 1)
     PLUGIN.set_content('videos')
     return PLUGIN.finish(items, update_listing=not created_from_main_listing)
 
@@ -102,14 +119,16 @@ def create_evaluated_amv_list(page):
         items = []
         if page > 1:
             items.append(_create_prev_page_item('create_evaluated_amv_list', page))
-        for amv in AmvNewsBrowser().get_evaluated_amv_list(page):
+        browser = _get_browser()
+        for amv in browser.get_evaluated_amv_list(page):
             context_menu = [
-                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv['id'])),
-                (PLUGIN.get_string(10005), 'RunPlugin(%s)' % PLUGIN.url_for('add_to_favourites', amv_id=amv['id'])),
-                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv['id'])),
+                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv.id)),
+                (PLUGIN.get_string(10005), 'RunPlugin(%s)' % PLUGIN.url_for('add_to_favourites', amv_id=amv.id)),
+                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv.id)),
             ]
             items.append(_create_amv_item(amv, context_menu))
         items.append(_create_next_page_item('create_evaluated_amv_list', page))
+        browser.schedule_prefetch('evaluated', page + 1)
         PLUGIN.set_content('videos')
         return PLUGIN.finish(items, update_listing=not created_from_main_listing)
 
@@ -137,18 +156,72 @@ def create_favourite_amv_list(page):
         items = []
         if page > 1:
             items.append(_create_prev_page_item('create_favourite_amv_list', page))
-        for amv in AmvNewsBrowser().get_favourite_amv_list(page):
+        browser = _get_browser()
+        for amv in browser.get_favourite_amv_list(page):
             context_menu = [
-                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv['id'])),
-                (PLUGIN.get_string(10009), 'RunPlugin(%s)' % PLUGIN.url_for('remove_from_favourites', amv_id=amv['id'])),
-                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv['id'])),
+                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv.id)),
+                (PLUGIN.get_string(10009), 'RunPlugin(%s)' % PLUGIN.url_for('remove_from_favourites', amv_id=amv.id)),
+                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv.id)),
             ]
             items.append(_create_amv_item(amv, context_menu))
         items.append(_create_next_page_item('create_favourite_amv_list', page))
+        browser.schedule_prefetch('favourite', page + 1)
         PLUGIN.set_content('videos')
         return PLUGIN.finish(items, update_listing=not created_from_main_listing)
 
 
+@PLUGIN.route('/search')
+def search():
+    """
+    Ask the user for search query and show found AMV.
+    """
+    query = PLUGIN.keyboard(heading=PLUGIN.get_string(10019))
+    if query and query.strip():
+        return PLUGIN.redirect(PLUGIN.url_for('create_search_result_list', query=query.strip(), page=0))
+
+
+@PLUGIN.route('/search/<query>/<page>')
+def create_search_result_list(query, page):
+    """
+    Create list of AMV found by the local search for specified page.
+
+    AMV are searched among AMV which metadata has ever been obtained from the site, the site itself isn't queried.
+    Syntax of the query is described in `search` module.
+
+    :param str query: Search query.
+    :param int page: Page number.
+    :return: List of found AMV.
+    :rtype: list[dict]
+    """
+    from search import parse_query
+
+    page = int(page)
+    created_from_search = (page == 0)
+    if page == 0:
+        page = 1
+
+    items = []
+    if page > 1:
+        items.append(_create_prev_page_item('create_search_result_list', page, query=query))
+    amv_list, has_more = _get_browser().search_amv_list(parse_query(query), page)
+    for amv in amv_list:
+        context_menu = []
+        if PLUGIN.get_setting('username') and PLUGIN.get_setting('password'):
+            context_menu.extend([
+                (PLUGIN.get_string(10004), 'RunPlugin(%s)' % PLUGIN.url_for('evaluate', amv_id=amv.id)),
+                (PLUGIN.get_string(10005), 'RunPlugin(%s)' % PLUGIN.url_for('add_to_favourites', amv_id=amv.id)),
+                (PLUGIN.get_string(10010), 'RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv.id)),
+            ])
+        if isinstance(amv, AmvSummary):
+            items.append(_create_amv_summary_item(amv, context_menu))
+        else:
+            items.append(_create_amv_item(amv, context_menu))
+    if has_more:
+        items.append(_create_next_page_item('create_search_result_list', page, query=query))
+    PLUGIN.set_content('videos')
+    return PLUGIN.finish(items, update_listing=not created_from_search)
+
+
 @PLUGIN.route('/evaluate/<amv_id>')
 def evaluate(amv_id):
     """
@@ -157,7 +230,7 @@ def evaluate(amv_id):
     :param int amv_id: AMV identifier.
     """
     chosen_mark = xbmcgui.Dialog().select(PLUGIN.get_string(10201), list(map(PLUGIN.get_string, range(10202, 10207)))) + 1
-    AmvNewsBrowser().set_amv_mark(int(amv_id), chosen_mark)
+    _get_browser().set_amv_mark(int(amv_id), chosen_mark)
     if PLUGIN.get_setting('download_evaluated', bool) and (PLUGIN.get_setting('download_treshold', int) + 1) <= chosen_mark:
         xbmc.executebuiltin('RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv_id))
 
@@ -169,7 +242,7 @@ def add_to_favourites(amv_id):
 
     :param int amv_id: AMV identifier.
     """
-    AmvNewsBrowser().add_amv_to_favourites(int(amv_id))
+    _get_browser().add_amv_to_favourites(int(amv_id))
     if PLUGIN.get_setting('download_favourites', bool):
         xbmc.executebuiltin('RunPlugin(%s)' % PLUGIN.url_for('download', amv_id=amv_id))
 
@@ -181,7 +254,7 @@ def remove_from_favourites(amv_id):
 
     :param int amv_id: AMV identifier.
     """
-    AmvNewsBrowser().remove_amv_from_favourites(int(amv_id))
+    _get_browser().remove_amv_from_favourites(int(amv_id))
 
 
 @PLUGIN.route('/play/<amv_id>/<subtitles_id>', name='play_with_subtitles')
@@ -193,8 +266,22 @@ def play(amv_id, subtitles_id=None):
     :param int amv_id: AMV identifier.
     :param int|None subtitles_id: Subtitles identifier.
     """
-    video_path = AmvNewsBrowser.get_amv_url(amv_id)
-    subtitles_path = AmvNewsBrowser.get_subtitles_url(subtitles_id) if subtitles_id else None
+    video_path = get_amv_url(amv_id)
+    subtitles_path = get_subtitles_url(subtitles_id) if subtitles_id else None
+    PLUGIN.set_resolved_url(video_path, subtitles_path)
+
+
+@PLUGIN.route('/resolve/<amv_id>')
+def resolve_and_play(amv_id):
+    """
+    Play AMV which full metadata hasn't been obtained by the listing.
+
+    :param int amv_id: AMV identifier.
+    """
+    amv_info = _get_browser().get_amv(int(amv_id))
+    subtitles_id = _choose_subtitles(amv_info)
+    video_path = get_amv_url(amv_id)
+    subtitles_path = get_subtitles_url(subtitles_id) if subtitles_id else None
     PLUGIN.set_resolved_url(video_path, subtitles_path)
 
 
@@ -207,15 +294,19 @@ def download(amv_id):
     if not PLUGIN.get_setting('download_path'):
         xbmcgui.Dialog().ok(PLUGIN.name, PLUGIN.get_string(10011))
     else:
-        browser = AmvNewsBrowser()
+        browser = _get_browser()
         amv_info = browser.get_amv(int(amv_id))
 
         pDialog = xbmcgui.DialogProgressBG()
-        pDialog.create(PLUGIN.name, PLUGIN.get_string(10012) % amv_info['amv']['title'])
-        browser.download(PLUGIN.get_setting('download_path'), amv_info['id'], _choose_subtitles(amv_info))
+        pDialog.create(PLUGIN.name, PLUGIN.get_string(10012) % amv_info.title)
+        failed_ids = _download_amv_pages(browser, [[amv_info]], pDialog)
         pDialog.close()
-        xbmc.executebuiltin('XBMC.UpdateLibrary(video)')
-        xbmcgui.Dialog().notification(PLUGIN.name, PLUGIN.get_string(10013) % amv_info['amv']['title'])
+        request_library_update(PLUGIN.get_setting('download_path'))
+        if failed_ids:
+            xbmcgui.Dialog().notification(
+                PLUGIN.name, PLUGIN.get_string(10020) % amv_info.title, xbmcgui.NOTIFICATION_ERROR)
+        else:
+            xbmcgui.Dialog().notification(PLUGIN.name, PLUGIN.get_string(10013) % amv_info.title)
 
 
 @PLUGIN.route('/download_favourites')
@@ -228,28 +319,26 @@ def download_favourites():
     elif not PLUGIN.get_setting('download_path'):
         xbmcgui.Dialog().ok(PLUGIN.name, PLUGIN.get_string(10011))
     else:
-        page = 1
-        amv_list = []
-        browser = AmvNewsBrowser()
+        from storage import PRIORITY_BACKGROUND
+        from sync import ListingSync
+
+        browser = _get_browser()
+        # Bulk downloading yields to AMV listings browsed meanwhile
+        browser.http.priority = PRIORITY_BACKGROUND
+        sync = ListingSync(browser, 'favourite', PLUGIN.get_setting('sync_incremental', bool))
 
         pDialog = xbmcgui.DialogProgressBG()
         pDialog.create(PLUGIN.name, PLUGIN.get_string(10014))
 
-        while True:
-            amv_chunk = browser.get_favourite_amv_list(page)
-            if amv_chunk:
-                amv_list.extend(amv_chunk)
-                page += 1
-            else:
-                break
-
-        for i, amv_info in enumerate(amv_list):
-            pDialog.update(i * 100 // len(amv_list), PLUGIN.name, PLUGIN.get_string(10012) % amv_info['amv']['title'])
-            browser.download(PLUGIN.get_setting('download_path'), amv_info['id'], _choose_subtitles(amv_info))
+        failed_ids = _download_amv_pages(browser, sync.iter_amv_pages(), pDialog)
+        removed_ids = sync.commit(failed_ids)
 
         pDialog.close()
-        xbmc.executebuiltin('XBMC.UpdateLibrary(video)')
-        xbmcgui.Dialog().notification(PLUGIN.name, PLUGIN.get_string(10015))
+        request_library_update(PLUGIN.get_setting('download_path'))
+        _notify_downloaded(failed_ids)
+        if removed_ids:
+            PLUGIN.log.info('AMV removed from favourites: %s', ', '.join(map(str, removed_ids)))
+            xbmcgui.Dialog().notification(PLUGIN.name, PLUGIN.get_string(10016) % len(removed_ids))
 
 
 @PLUGIN.route('/download_evaluated')
@@ -262,38 +351,107 @@ def download_evaluated():
     elif not PLUGIN.get_setting('download_path'):
         xbmcgui.Dialog().ok(PLUGIN.name, PLUGIN.get_string(10011))
     else:
-        page = 1
-        amv_list = []
-        browser = AmvNewsBrowser()
+        from storage import PRIORITY_BACKGROUND
+
+        browser = _get_browser()
+        browser.http.priority = PRIORITY_BACKGROUND
+        min_mark = PLUGIN.get_setting('download_treshold', int) + 1
 
         pDialog = xbmcgui.DialogProgressBG()
         pDialog.create(PLUGIN.name, PLUGIN.get_string(10014))
 
-        while True:
-            amv_chunk = filter(
-                lambda x: int(x['amv']['user_rating']) >= (PLUGIN.get_setting('download_treshold', int) + 1),
-                browser.get_evaluated_amv_list(page))
-            if amv_chunk:
-                amv_list.extend(amv_chunk)
-                page += 1
-            else:
-                break
-
-        for i, amv_info in enumerate(amv_list):
-            pDialog.update(i * 100 // len(amv_list), PLUGIN.name, PLUGIN.get_string(10012) % amv_info['amv']['title'])
-            browser.download(PLUGIN.get_setting('download_path'), amv_info['id'], _choose_subtitles(amv_info))
+        # Pages are filtered lazily, paging stops at the end of the listing rather than at a page without good AMV
+        amv_pages = (
+            [amv_info for amv_info in amv_list if int(amv_info.user_rating) >= min_mark]
+            for amv_list in browser.iter_amv_pages('evaluated'))
+        failed_ids = _download_amv_pages(browser, amv_pages, pDialog)
 
         pDialog.close()
-        xbmc.executebuiltin('XBMC.UpdateLibrary(video)')
+        request_library_update(PLUGIN.get_setting('download_path'))
+        _notify_downloaded(failed_ids)
+
+
+@PLUGIN.route('/reconcile_downloads')
+def reconcile_downloads():
+    """
+    Rebuild list of downloaded AMVs from content of the download folder.
+    """
+    if not PLUGIN.get_setting('download_path'):
+        xbmcgui.Dialog().ok(PLUGIN.name, PLUGIN.get_string(10011))
+    else:
+        from downloads import open_manifest, reconcile_manifest
+
+        amv_count = reconcile_manifest(open_manifest(PLUGIN.get_setting('download_path')))
+        xbmcgui.Dialog().notification(PLUGIN.name, PLUGIN.get_string(10017) % amv_count)
+
+
+@PLUGIN.route('/diagnostics')
+def show_diagnostics():
+    """
+    Show latencies and cache effectiveness of the recent plugin invocations.
+    """
+    from stats import load_stats, format_stats
+
+    xbmcgui.Dialog().textviewer(PLUGIN.name, format_stats(load_stats()), usemono=True)
+
+
+def _get_browser():
+    """
+    Get browser to access AmvNews site.
+
+    :rtype: AmvNewsBrowser
+    """
+    from amvnews import AmvNewsBrowser
+
+    return AmvNewsBrowser()
+
+
+def _download_amv_pages(browser, amv_pages, progress_dialog):
+    """
+    Download AMVs in parallel showing progress in bytes.
+
+    Downloading of AMV from a page starts as soon as the page is obtained, so the next pages are crawled while files
+    are transferred and pages aren't kept in memory.
+
+    :param AmvNewsBrowser browser: Browser to access AmvNews site.
+    :param collections.Iterable[list[AmvInfo]] amv_pages: Pages of AMV information.
+    :param xbmcgui.DialogProgressBG progress_dialog: Dialog to show progress.
+    :return: Identifiers of AMV which haven't been downloaded due to errors.
+    :rtype: set[int]
+    """
+    from downloads import DownloadManager
+
+    manager = DownloadManager(
+        browser, PLUGIN.get_setting('download_path'), PLUGIN.get_setting('download_workers', int),
+        lambda downloaded, total, title: progress_dialog.update(
+            downloaded * 100 // total if total else 0, PLUGIN.name, PLUGIN.get_string(10012) % title))
+    for amv_list in amv_pages:
+        for amv_info in amv_list:
+            manager.add(amv_info, _choose_subtitles(amv_info))
+    return manager.wait()
+
+
+def _notify_downloaded(failed_ids):
+    """
+    Notify the user that bulk downloading is finished.
+
+    :param set[int] failed_ids: Identifiers of AMV which haven't been downloaded due to errors.
+    """
+    if failed_ids:
+        xbmcgui.Dialog().notification(
+            PLUGIN.name, PLUGIN.get_string(10021) % (len(failed_ids), ', '.join(map(str, sorted(failed_ids)))),
+            xbmcgui.NOTIFICATION_ERROR)
+    else:
         xbmcgui.Dialog().notification(PLUGIN.name, PLUGIN.get_string(10015))
 
 
-def _create_next_page_item(view_name, current_page):
+def _create_next_page_item(view_name, current_page, **url_params):
     """
     Create list item to show next page of view.
 
     :param str view_name: Name of view.
     :param int current_page: Current page number.
+    :param url_params: Other arguments of view.
     :return: List item to show next page.
     :rtype: dict
     """
@@ -302,16 +460,17 @@ def _create_next_page_item(view_name, current_page):
         'icon': None,
         'thumbnail': None,
         'context_menu': [],
-        'path': PLUGIN.url_for(endpoint=view_name, page=current_page + 1)
+        'path': PLUGIN.url_for(endpoint=view_name, page=current_page + 1, **url_params)
     }
 
 
-def _create_prev_page_item(view_name, current_page):
+def _create_prev_page_item(view_name, current_page, **url_params):
     """
     Create list item to show previous page of view.
 
     :param str view_name: Name of view.
     :param int current_page: Current page number.
+    :param url_params: Other arguments of view.
     :return: List item to show previous page.
     :rtype: dict
     """
@@ -320,7 +479,7 @@ def _create_prev_page_item(view_name, current_page):
         'icon': None,
         'thumbnail': None,
         'context_menu': [],
-        'path': PLUGIN.url_for(endpoint=view_name, page=current_page - 1)
+        'path': PLUGIN.url_for(endpoint=view_name, page=current_page - 1, **url_params)
     }
 
 
@@ -328,63 +487,87 @@ def _create_amv_item(amv_info, context_menu):
     """
     Create list item for AMV.
 
-    :param dict amv_info: AMV information.
+    :param AmvInfo amv_info: AMV information.
     :param list context_menu: Context menu for item.
     :return: List item for AMV.
     :rtype: dict
     """
-    amv_id = amv_info['id']
-    if amv_info['subtitles']:
+    amv_id = amv_info.id
+    if amv_info.subtitles:
         path = PLUGIN.url_for('play_with_subtitles', amv_id=amv_id, subtitles_id=_choose_subtitles(amv_info))
     else:
         path = PLUGIN.url_for('play', amv_id=amv_id)
 
     return {
-        'label': amv_info['amv']['title'],
-        'icon': amv_info['image'],
-        'thumbnail': amv_info['image'],
+        'label': amv_info.title,
+        'icon': amv_info.image,
+        'thumbnail': amv_info.image,
         'path': path,
         'is_playable': True,
         'context_menu': context_menu,
         'info': {
             'count': amv_id,
-            'size': amv_info['video']['size'],
-            'director': amv_info['amv']['author'],
-            'plot': amv_info['amv']['description'],
-            'aired': amv_info['amv']['aired'],
-            'dateadded': amv_info['amv']['added'],
-            'votes': amv_info['amv']['votes'],
-            'genre': amv_info['amv']['genre'],
-            'rating': amv_info['amv']['rating'] * 2,
-            'userrating': amv_info['amv']['user_rating'] * 2,
-            'title': amv_info['amv']['title'],
-            'duration': amv_info['video']['duration'],
+            'size': amv_info.video.size,
+            'director': amv_info.author,
+            'plot': amv_info.description,
+            'aired': amv_info.aired,
+            'dateadded': amv_info.added,
+            'votes': amv_info.votes,
+            'genre': amv_info.genre,
+            'rating': amv_info.rating * 2,
+            'userrating': amv_info.user_rating * 2,
+            'title': amv_info.title,
+            'duration': amv_info.video.duration,
             'mediatype': 'musicvideo'
         },
         'stream_info': {
             'video': {
-                'codec': amv_info['video']['video_codec'],
-                'aspect': amv_info['video']['aspect'],
-                'width': amv_info['video']['width'],
-                'height': amv_info['video']['height'],
-                'duration': amv_info['video']['duration']
+                'codec': amv_info.video.video_codec,
+                'aspect': amv_info.video.aspect,
+                'width': amv_info.video.width,
+                'height': amv_info.video.height,
+                'duration': amv_info.video.duration
             },
             'audio': {
-                'codec': amv_info['video']['audio_codec']
+                'codec': amv_info.video.audio_codec
             }
         }
     }
 
 
+def _create_amv_summary_item(amv_info, context_menu):
+    """
+    Create list item for AMV described by summary metadata only.
+
+    :param AmvSummary amv_info: AMV summary information.
+    :param list context_menu: Context menu for item.
+    :return: List item for AMV.
+    :rtype: dict
+    """
+    return {
+        'label': amv_info.title,
+        'icon': amv_info.image,
+        'thumbnail': amv_info.image,
+        'path': PLUGIN.url_for('resolve_and_play', amv_id=amv_info.id),
+        'is_playable': True,
+        'context_menu': context_menu,
+        'info': {
+            'count': amv_info.id,
+            'title': amv_info.title,
+            'mediatype': 'musicvideo'
+        }
+    }
+
+
 def _choose_subtitles(amv_info):
     """
     Choose best subtitles for AMV.
 
-    :param dict amv_info: AMV information
+    :param AmvInfo amv_info: AMV information
     :return: Subtitles identifier.
     :rtype: int
     """
-    if not amv_info['subtitles']:
+    if not amv_info.subtitles:
         return None
 
     if PLUGIN.get_setting('subtitles_lang') == '0':
@@ -392,10 +575,10 @@ def _choose_subtitles(amv_info):
     elif PLUGIN.get_setting('subtitles_lang') == '1':
         subtitles_lang = Language.English
 
-    preferable_subtitles = list(filter(lambda x: x[0] == subtitles_lang, amv_info['subtitles']))
+    preferable_subtitles = list(filter(lambda x: x.language == subtitles_lang, amv_info.subtitles))
     if preferable_subtitles:
-        subtitles_id = preferable_subtitles[0][1]
+        subtitles_id = preferable_subtitles[0].id
     else:
-        subtitles_id = amv_info['subtitles'][0][1]
+        subtitles_id = amv_info.subtitles[0].id
 
     return subtitles_id
@@ -0,0 +1,305 @@
+# coding=utf-8
+"""
+Local search of AMV.
+
+Every AMV which metadata has been obtained from the site is put to an inverted index kept in the plugin profile, so
+AMV are found by words of their title, author, genres and description and filtered by rating, duration and
+resolution without requests to the site. Unlike the metadata cache the index isn't bounded by the cache limits, its
+entries are small and AMV evicted from the cache are still found.
+
+Query is a list of words, AMV having all of them (as prefixes of words) are found. Words of the form `key:value`
+restrict search to one field or filter AMV by their properties:
+
+* `author:name`, `genre:name` - word of the author or of the genres;
+* `lang:ru`, `lang:en` - subtitles of the language;
+* `rating:4`, `duration:3-5`, `res:720` - minimal value or range of rating (0-5), duration (minutes) or height of
+  video (lines), one of range bounds may be omitted (`duration:-4`); `720p` is a shortcut for `res:720`.
+"""
+import re
+import threading
+from helpers import Language, open_database
+from metadata import AmvSummary
+
+__all__ = ['SearchIndex', 'SearchQuery', 'parse_query', 'get_terms']
+
+# Version of the index, it is rebuilt from the metadata cache when terms are extracted differently
+INDEX_VERSION = 1
+
+# Shorter words are neither indexed nor searched
+MIN_TERM_LENGTH = 2
+
+# Prefixes of terms restricted to a field of AMV by keys of query words
+FIELD_PREFIXES = {
+    'author': 'author:',
+    'genre': 'genre:',
+    'lang': 'lang:',
+}
+
+# Codes of subtitles languages used by queries
+LANGUAGE_CODES = {Language.Russian: 'ru', Language.English: 'en'}
+
+# Filters by range of AMV properties: key of the query word, column of the index and scale of the query value
+RANGE_FILTERS = {
+    'rating': ('rating', 1),
+    'duration': ('duration', 60),
+    'res': ('height', 1),
+}
+
+# AMV having a term found in more AMV are scanned in order of rating rather than looked up in the index
+MAX_LOOKUP_SIZE = 10000
+
+# Character which is greater than any character of terms, it bounds range of terms starting with a prefix
+MAX_CHAR = u'\U0010ffff'
+
+REGEX_WORD = re.compile(u'\\w+')
+REGEX_FILTER = re.compile(u'^(\\w+):(.*)$')
+REGEX_RANGE = re.compile(u'^(\\d+(?:\\.\\d+)?)?(-)?(\\d+(?:\\.\\d+)?)?$')
+REGEX_RESOLUTION = re.compile(u'^(\\d{3,4})p$')
+
+
+class SearchQuery(object):
+    """
+    Parsed search query.
+    """
+
+    def __init__(self, terms, ranges):
+        """
+        :param list[str] terms: Prefixes of terms which all found AMV must have.
+        :param dict[str, tuple(float|None, float|None)] ranges: Bounds of values by columns of the index.
+        """
+        self.terms = terms
+        self.ranges = ranges
+
+    def __bool__(self):
+        return bool(self.terms or self.ranges)
+
+
+class SearchIndex(object):
+    """
+    SQLite inverted index of AMV metadata.
+
+    Index maps terms to identifiers of AMV. Terms of every AMV are kept with its entry, so updated metadata changes
+    only terms which have been added or removed. Terms starting with a prefix are found by a range scan of the primary
+    key, AMV having several terms are found by intersection of such scans.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the index database.
+        """
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                aired TEXT NOT NULL,
+                image TEXT,
+                rating REAL NOT NULL,
+                duration INTEGER NOT NULL,
+                height INTEGER NOT NULL,
+                terms TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS documents_rating ON documents (rating);
+            CREATE TABLE IF NOT EXISTS terms (
+                term TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (term, id)
+            ) WITHOUT ROWID;
+        ''')
+
+    def is_outdated(self):
+        """
+        Check whether the index has been built by another version of the plugin or hasn't been built at all.
+
+        :rtype: bool
+        """
+        with self._lock:
+            return self._connection.execute('PRAGMA user_version').fetchone()[0] != INDEX_VERSION
+
+    def rebuild(self, amv_pages):
+        """
+        Build the index from scratch.
+
+        :param collections.Iterable[list[AmvInfo]] amv_pages: Portions of metadata of all known AMV.
+        """
+        with self._lock:
+            self._connection.execute('PRAGMA user_version = 0')
+            self._connection.execute('DELETE FROM documents')
+            self._connection.execute('DELETE FROM terms')
+        for amv_info_list in amv_pages:
+            self.put_many(amv_info_list)
+        with self._lock:
+            self._connection.execute('PRAGMA user_version = {:d}'.format(INDEX_VERSION))
+
+    def put_many(self, amv_info_list):
+        """
+        Add AMV to the index or update their entries.
+
+        :param list[AmvInfo] amv_info_list: Metadata of AMV.
+        """
+        if not amv_info_list:
+            return
+
+        amv_info_list = list({amv_info.id: amv_info for amv_info in amv_info_list}.values())
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                indexed_terms = {}
+                amv_ids = [amv_info.id for amv_info in amv_info_list]
+                # SQLite limits number of query parameters
+                for i in range(0, len(amv_ids), 500):
+                    chunk = amv_ids[i:i + 500]
+                    indexed_terms.update(
+                        (amv_id, set(terms.split())) for amv_id, terms in self._connection.execute(
+                            'SELECT id, terms FROM documents WHERE id IN ({})'.format(', '.join('?' * len(chunk))),
+                            chunk))
+
+                removed, added, documents = [], [], []
+                for amv_info in amv_info_list:
+                    terms = get_terms(amv_info)
+                    old_terms = indexed_terms.get(amv_info.id, set())
+                    removed.extend((term, amv_info.id) for term in old_terms - terms)
+                    added.extend((term, amv_info.id) for term in terms - old_terms)
+                    documents.append((
+                        amv_info.id, amv_info.title, amv_info.aired, amv_info.image, amv_info.rating,
+                        amv_info.video.duration, amv_info.video.height, ' '.join(sorted(terms))
+                    ))
+
+                self._connection.executemany('DELETE FROM terms WHERE term = ? AND id = ?', removed)
+                self._connection.executemany('INSERT OR IGNORE INTO terms (term, id) VALUES (?, ?)', added)
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO documents (id, title, aired, image, rating, duration, height, terms) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?)', documents)
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def search(self, query, offset, limit):
+        """
+        Find AMV matching the query, AMV with higher rating go first.
+
+        AMV having the rarest term of the query are looked up in the index and checked for other terms. If all terms
+        are common, AMV are scanned in order of rating until the page is filled, so common words (e.g. the first
+        letters of a word) are found as fast as rare ones.
+
+        :param SearchQuery query: Search query.
+        :param int offset: Number of found AMV to skip.
+        :param int limit: Maximal number of found AMV.
+        :return: Summary metadata of found AMV, date of AMV is the date when it was aired.
+        :rtype: list[AmvSummary]
+        """
+        with self._lock:
+            conditions, params = [], []
+            terms = sorted((self._count_documents(term), term) for term in set(query.terms))
+            if terms and terms[0][0] < MAX_LOOKUP_SIZE:
+                conditions.append('id IN (SELECT id FROM terms WHERE term >= ? AND term < ?)')
+                params.extend([terms[0][1], terms[0][1] + MAX_CHAR])
+                terms = terms[1:]
+            for _, term in terms:
+                # Terms of AMV are separated by spaces, so the term is the prefix of one of them
+                conditions.append("instr(' ' || terms, ?) > 0")
+                params.append(' ' + term)
+            for column, (low, high) in sorted(query.ranges.items()):
+                if low is not None:
+                    conditions.append('{} >= ?'.format(column))
+                    params.append(low)
+                if high is not None:
+                    conditions.append('{} <= ?'.format(column))
+                    params.append(high)
+
+            rows = self._connection.execute(
+                'SELECT id, title, aired, image FROM documents {} ORDER BY rating DESC, id DESC LIMIT ? OFFSET ?'
+                .format('WHERE ' + ' AND '.join(conditions) if conditions else ''), params + [limit, offset]).fetchall()
+        return [AmvSummary(amv_id, title, aired, image) for amv_id, title, aired, image in rows]
+
+    def _count_documents(self, term):
+        """
+        Count AMV having terms starting with the prefix, AMV are counted up to `MAX_LOOKUP_SIZE`.
+
+        :param str term: Prefix of terms.
+        :rtype: int
+        """
+        return self._connection.execute(
+            'SELECT COUNT(*) FROM (SELECT 1 FROM terms WHERE term >= ? AND term < ? LIMIT ?)',
+            (term, term + MAX_CHAR, MAX_LOOKUP_SIZE)).fetchone()[0]
+
+
+def parse_query(text):
+    """
+    Parse search query entered by the user.
+
+    Words of the form `key:value` with unknown keys or values which can't be parsed are searched as usual words.
+
+    :param str text: Search query.
+    :rtype: SearchQuery
+    """
+    terms, ranges = [], {}
+    for word in text.split():
+        match = REGEX_FILTER.match(word)
+        key, value = (match.group(1).lower(), match.group(2)) if match else (None, word)
+        if key in RANGE_FILTERS:
+            column, scale = RANGE_FILTERS[key]
+            bounds = _parse_range(value, scale)
+            if bounds:
+                ranges[column] = bounds
+                continue
+        elif key in FIELD_PREFIXES:
+            terms.extend(FIELD_PREFIXES[key] + term for term in _tokenize(value))
+            continue
+        else:
+            match = REGEX_RESOLUTION.match(word.lower())
+            if match:
+                ranges['height'] = (int(match.group(1)), None)
+                continue
+        terms.extend(_tokenize(word))
+    return SearchQuery(terms, ranges)
+
+
+def get_terms(amv_info):
+    """
+    Get terms of AMV to be indexed.
+
+    :param AmvInfo amv_info: AMV metadata.
+    :rtype: set[str]
+    """
+    author_terms = _tokenize(amv_info.author)
+    genre_terms = _tokenize(amv_info.genre)
+    terms = set(_tokenize(amv_info.title))
+    terms.update(author_terms)
+    terms.update(genre_terms)
+    terms.update(_tokenize(amv_info.description))
+    terms.update(FIELD_PREFIXES['author'] + term for term in author_terms)
+    terms.update(FIELD_PREFIXES['genre'] + term for term in genre_terms)
+    terms.update(FIELD_PREFIXES['lang'] + LANGUAGE_CODES[subtitles.language] for subtitles in amv_info.subtitles
+                 if subtitles.language in LANGUAGE_CODES)
+    return terms
+
+
+def _tokenize(text):
+    """
+    Split text into normalized words.
+
+    :param str text: Text.
+    :return: Words of the text in lower case, 'ё' is replaced by 'е'.
+    :rtype: list[str]
+    """
+    return [word for word in REGEX_WORD.findall(text.lower().replace(u'ё', u'е')) if len(word) >= MIN_TERM_LENGTH]
+
+
+def _parse_range(value, scale):
+    """
+    Parse bounds of the range filter.
+
+    :param str value: Minimal value (`4`) or range of values (`3-5`, `-5`, `3-`).
+    :param float scale: Multiplier which converts values to units of the index.
+    :return: Lower and upper bounds (None if the bound is omitted) or None if the value can't be parsed.
+    :rtype: tuple(float|None, float|None)|None
+    """
+    match = REGEX_RANGE.match(value)
+    if not match or not (match.group(1) or match.group(3)):
+        return None
+    low = float(match.group(1)) * scale if match.group(1) else None
+    high = float(match.group(3)) * scale if match.group(3) else None
+    return low, high
@@ -0,0 +1,96 @@
+# coding=utf-8
+"""
+Background service of the plugin.
+"""
+import xbmc
+from amvnews import AmvNewsBrowser
+from constants import PLUGIN
+from library import run_requested_library_update
+from stats import STATS
+from storage import TASK_REFRESH_AMV, TASK_PREFETCH_PAGE, PRIORITY_INTERACTIVE, PRIORITY_PREFETCH, PRIORITY_BACKGROUND
+
+# Interval between checks of the task queue (seconds)
+POLL_INTERVAL = 2
+
+
+def run():
+    """
+    Execute tasks queued by the plugin until Kodi is closed.
+
+    Metadata requested by shown listings goes first, then listing pages are prefetched, then outdated metadata is
+    refreshed, then the site catalog is crawled by portions if it is enabled. Library updates requested by downloads
+    are performed between tasks. The search index is built from the metadata cache before, if the cache has been
+    filled by a version of the plugin without the index. Metadata cached by version 4.1.0 and earlier is imported
+    before all.
+    """
+    monitor = xbmc.Monitor()
+    browser = AmvNewsBrowser()
+    _run_task('import legacy metadata', browser.import_legacy_metadata)
+    _run_task('rebuild the search index', browser.rebuild_search_index)
+    while not monitor.abortRequested():
+        _run_task('update the library', run_requested_library_update)
+        # The service waits after a failure as well, so a persistent error doesn't make it spin
+        if not _run_task('execute queued tasks', _run_next_task, browser, monitor):
+            _run_task('save statistics', STATS.flush, 'service')
+            if monitor.waitForAbort(POLL_INTERVAL):
+                break
+
+
+def _run_next_task(browser, monitor):
+    """
+    Execute the next portion of queued tasks.
+
+    :param AmvNewsBrowser browser: Browser to access AmvNews site.
+    :param xbmc.Monitor monitor: Kodi monitor.
+    :return: Whether there were tasks to execute.
+    :rtype: bool
+    """
+    task_queue = browser.task_queue
+
+    amv_ids = task_queue.pop(TASK_REFRESH_AMV, browser.max_workers, min_priority=PRIORITY_INTERACTIVE)
+    if amv_ids:
+        # Requests are made on behalf of the task, so the rate limit lets requests of shown listings go first
+        browser.http.priority = PRIORITY_INTERACTIVE
+        _run_task('refresh metadata', browser.fetch_amv_list, [int(amv_id) for amv_id in amv_ids])
+        return True
+
+    pages = task_queue.pop(TASK_PREFETCH_PAGE, 1)
+    if pages:
+        browser.http.priority = PRIORITY_PREFETCH
+        listing, page = pages[0].split(':')
+        _run_task('prefetch {} page {}'.format(listing, page), browser.prefetch, listing, int(page),
+                  lambda: monitor.abortRequested() or task_queue.has_tasks(TASK_PREFETCH_PAGE))
+        return True
+
+    amv_ids = task_queue.pop(TASK_REFRESH_AMV, browser.max_workers)
+    if amv_ids:
+        browser.http.priority = PRIORITY_BACKGROUND
+        _run_task('refresh metadata', browser.fetch_amv_list, [int(amv_id) for amv_id in amv_ids])
+        return True
+
+    if PLUGIN.get_setting('crawl_catalog', bool) and browser.crawl_state.is_due():
+        browser.http.priority = PRIORITY_BACKGROUND
+        _run_task('crawl the catalog', browser.crawl_catalog)
+        return True
+
+    return False
+
+
+def _run_task(description, function, *args):
+    """
+    Execute task, the task is dropped if it fails, so an error doesn't stop the service.
+
+    :param str description: Description of the task for the log.
+    :param callable function: Task function.
+    :param args: Task arguments.
+    :return: Result of the task or None if it has failed.
+    """
+    try:
+        return function(*args)
+    except Exception:
+        PLUGIN.log.exception('Failed to %s', description)
+        return None
+
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,193 @@
+# coding=utf-8
+"""
+Performance statistics of the plugin.
+
+Timings and counters are collected in memory during plugin invocation and appended as a single JSON line to the
+rolling statistics file in the plugin profile.
+"""
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from constants import PLUGIN
+
+__all__ = ['STATS', 'load_stats', 'format_stats']
+
+# Statistics file is cut in half once it exceeds this size (bytes)
+MAX_STATS_FILE_SIZE = 2 * 1024 * 1024
+
+# Timings shown by the diagnostics in the order of the request processing
+TIMINGS = ['invocation', 'login', 'network', 'parse', 'storage', 'download']
+
+
+class Stats(object):
+    """
+    Collector of timings and counters shared by all threads of the process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._timings = defaultdict(list)
+        self._counters = Counter()
+
+    @contextlib.contextmanager
+    def timer(self, name):
+        """
+        Measure time of the code block.
+
+        :param str name: Name of the timing.
+        """
+        started = time.time()
+        try:
+            yield
+        finally:
+            self.record(name, (time.time() - started) * 1000)
+
+    def record(self, name, value):
+        """
+        Record value of the timing.
+
+        :param str name: Name of the timing.
+        :param float value: Value (milliseconds for timings).
+        """
+        with self._lock:
+            self._timings[name].append(round(value, 1))
+
+    def count(self, name, value=1):
+        """
+        Increase counter.
+
+        :param str name: Name of the counter.
+        :param int value: Increment.
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def flush(self, source):
+        """
+        Append collected statistics to the statistics file and start collecting from scratch.
+
+        :param str source: Name of the invocation (route or service).
+        """
+        with self._lock:
+            timings, self._timings = self._timings, defaultdict(list)
+            counters, self._counters = self._counters, Counter()
+        if not (timings or counters) or not PLUGIN.get_setting('collect_stats', bool):
+            return
+
+        path = _get_stats_path()
+        line = json.dumps({'time': time.time(), 'source': source, 'timings': timings, 'counters': counters})
+        with open(path, 'a', encoding='utf-8') as f:
+            f.write(line + '\n')
+        if os.path.getsize(path) > MAX_STATS_FILE_SIZE:
+            with open(path, encoding='utf-8') as f:
+                lines = f.readlines()
+            with open(path, 'w', encoding='utf-8') as f:
+                f.writelines(lines[len(lines) // 2:])
+
+
+def load_stats():
+    """
+    Load statistics of the recent invocations.
+
+    :return: Statistics of invocations.
+    :rtype: list[dict]
+    """
+    path = _get_stats_path()
+    if not os.path.exists(path):
+        return []
+
+    records = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                # Line may be cut by concurrent trimming
+                pass
+    return records
+
+
+def format_stats(records):
+    """
+    Make human readable report of latencies and cache effectiveness.
+
+    :param list[dict] records: Statistics of invocations.
+    :return: Report.
+    :rtype: str
+    """
+    timings, counters = defaultdict(list), Counter()
+    for record in records:
+        for name, values in record['timings'].items():
+            timings[name].extend(values)
+        counters.update(record['counters'])
+
+    lines = [
+        'Invocations: {}, since {}'.format(
+            len(records), time.strftime('%Y-%m-%d %H:%M', time.localtime(records[0]['time'])) if records else '-'),
+        '',
+        '{:<12}{:>8}{:>10}{:>10}'.format('Latency, ms', 'count', 'p50', 'p95'),
+    ]
+    for name in TIMINGS + sorted(set(timings) - set(TIMINGS)):
+        values = sorted(timings.get(name, []))
+        if values and name != 'download_speed':
+            lines.append('{:<12}{:>8}{:>10.1f}{:>10.1f}'.format(
+                name, len(values), _percentile(values, 50), _percentile(values, 95)))
+
+    requests_count = sum(value for name, value in counters.items() if name.startswith('http_'))
+    lines.extend([
+        '',
+        'HTTP requests: {}, not modified: {}, received: {:.1f} MB'.format(
+            requests_count, _ratio(counters['http_304'], requests_count), counters['network_bytes'] / 1048576.0),
+        'HTTP statuses: {}'.format(', '.join(
+            '{}: {}'.format(name[5:], value) for name, value in sorted(counters.items()) if name.startswith('http_'))),
+    ])
+
+    lookups_count = counters['metadata_hit'] + counters['metadata_stale'] + counters['metadata_miss']
+    lines.append('AMV metadata cache: hit {}, stale {}, miss {}'.format(
+        _ratio(counters['metadata_hit'], lookups_count), _ratio(counters['metadata_stale'], lookups_count),
+        _ratio(counters['metadata_miss'], lookups_count)))
+
+    speeds = sorted(timings.get('download_speed', []))
+    if speeds:
+        lines.append('Downloads: {:.1f} MB, throughput p50 {:.0f} KB/s, p5 {:.0f} KB/s'.format(
+            counters['download_bytes'] / 1048576.0, _percentile(speeds, 50), _percentile(speeds, 5)))
+    return '\n'.join(lines)
+
+
+def _get_stats_path():
+    """
+    Get path to the statistics file.
+
+    :rtype: str
+    """
+    return os.path.join(PLUGIN.storage_path, 'stats.jsonl')
+
+
+def _percentile(values, percent):
+    """
+    Get percentile of sorted values by the nearest-rank method.
+
+    :param list[float] values: Sorted values.
+    :param int percent: Percent.
+    :rtype: float
+    """
+    return values[max(0, int(math.ceil(percent / 100.0 * len(values))) - 1)]
+
+
+def _ratio(value, total):
+    """
+    Format ratio of values as percents.
+
+    :param int value: Value.
+    :param int total: Total.
+    :rtype: str
+    """
+    return '{:.0f}%'.format(value * 100.0 / total) if total else '-'
+
+
+# Statistics of the current process
+STATS = Stats()
@@ -0,0 +1,706 @@
+# coding=utf-8
+"""
+Persistent storages of the plugin.
+"""
+import json
+import pickle
+import threading
+import time
+from helpers import open_database
+from metadata import FORMAT_VERSION, serialize, deserialize
+
+__all__ = [
+    'MetadataStore', 'TaskQueue', 'SyncStore', 'DownloadManifest', 'CrawlState', 'TASK_REFRESH_AMV',
+    'TASK_PREFETCH_PAGE', 'PRIORITY_INTERACTIVE', 'PRIORITY_PREFETCH', 'PRIORITY_BACKGROUND'
+]
+
+# Kinds of background tasks
+TASK_REFRESH_AMV = 'amv'
+TASK_PREFETCH_PAGE = 'page'
+
+# Priorities of background tasks
+PRIORITY_INTERACTIVE = 2
+PRIORITY_PREFETCH = 1
+PRIORITY_BACKGROUND = 0
+
+# Share of the limits of the metadata storage which is left filled by eviction, so eviction doesn't run on every write
+EVICTION_LOW_WATER = 0.9
+
+
+class MetadataStore(object):
+    """
+    SQLite storage of AMV metadata.
+
+    Metadata is stored serialized by `metadata.serialize`, time when metadata was obtained is duplicated into an
+    indexed column, so expired metadata is found without reading it. Metadata stored in older formats is migrated when
+    it is read. Size of the storage is bounded by number of rows and by total size of serialized metadata, least
+    recently used AMV are evicted first. Number of rows and total size are kept in a separate row updated by every
+    write, so limits are checked without scanning the table.
+    """
+
+    def __init__(self, path, max_rows, max_size):
+        """
+        :param str path: Path to the storage database.
+        :param int max_rows: Maximal number of stored AMV.
+        :param int max_size: Maximal total size of stored metadata in bytes.
+        """
+        self.max_rows = max_rows
+        self.max_size = max_size
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS amv (
+                id INTEGER PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                format INTEGER NOT NULL,
+                author TEXT,
+                genre TEXT,
+                rating REAL,
+                data BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS amv_timestamp ON amv (timestamp);
+            CREATE INDEX IF NOT EXISTS amv_accessed ON amv (accessed);
+            DROP INDEX IF EXISTS amv_format;
+            DROP INDEX IF EXISTS amv_author;
+            DROP INDEX IF EXISTS amv_genre;
+            DROP INDEX IF EXISTS amv_rating;
+            CREATE TABLE IF NOT EXISTS amv_totals (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                row_count INTEGER NOT NULL,
+                total_size INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS listings (
+                key TEXT PRIMARY KEY,
+                timestamp REAL NOT NULL,
+                data BLOB NOT NULL
+            );
+        ''')
+        if self._connection.execute('SELECT 1 FROM amv_totals').fetchone() is None:
+            # Totals are counted once for the storage filled before they were kept
+            self._connection.execute(
+                'INSERT OR IGNORE INTO amv_totals (id, row_count, total_size) '
+                'SELECT 0, COUNT(*), COALESCE(SUM(size), 0) FROM amv')
+        if self._connection.execute('PRAGMA user_version').fetchone()[0] != FORMAT_VERSION:
+            # Listings are cached for a short time, so listings stored in older formats are dropped
+            self._connection.execute('DELETE FROM listings')
+            self._connection.execute('PRAGMA user_version = {:d}'.format(FORMAT_VERSION))
+
+    def get(self, amv_id):
+        """
+        Get metadata of AMV.
+
+        :param int amv_id: Identifier of AMV.
+        :return: AMV metadata or None if it isn't stored.
+        :rtype: AmvInfo|None
+        """
+        return self.get_many([amv_id]).get(amv_id)
+
+    def get_many(self, amv_ids):
+        """
+        Get metadata of several AMV by a single query and mark them as recently used.
+
+        Metadata stored in older formats is migrated and stored in the current format.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: Metadata of stored AMV by their identifiers.
+        :rtype: dict[int, AmvInfo]
+        """
+        amv_ids = list(set(amv_ids))
+        rows = []
+        with self._lock:
+            # SQLite limits number of query parameters
+            for i in range(0, len(amv_ids), 500):
+                chunk = amv_ids[i:i + 500]
+                rows.extend(self._connection.execute(
+                    'SELECT id, format, data FROM amv WHERE id IN ({})'.format(', '.join('?' * len(chunk))), chunk))
+            if rows:
+                self._connection.executemany(
+                    'UPDATE amv SET accessed = ? WHERE id = ?', [(time.time(), row[0]) for row in rows])
+
+        result, migrated = {}, []
+        for amv_id, format_version, data in rows:
+            amv_info = deserialize(amv_id, format_version, data)
+            if amv_info is not None:
+                result[amv_id] = amv_info
+                if format_version != FORMAT_VERSION:
+                    migrated.append(amv_info)
+        if migrated:
+            self.put_many(migrated)
+        return result
+
+    def put(self, amv_info):
+        """
+        Store metadata of AMV.
+
+        :param AmvInfo amv_info: AMV metadata.
+        """
+        self.put_many([amv_info])
+
+    def put_many(self, amv_info_list):
+        """
+        Store metadata of several AMV and evict least recently used AMV if limits are exceeded.
+
+        :param list[AmvInfo] amv_info_list: Metadata of AMV.
+        """
+        if not amv_info_list:
+            return
+
+        now = time.time()
+        rows = {}
+        for amv_info in amv_info_list:
+            data = serialize(amv_info)
+            rows[amv_info.id] = (
+                amv_info.id, amv_info.timestamp, FORMAT_VERSION, amv_info.author, amv_info.genre, amv_info.rating,
+                data, len(data), now
+            )
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                replaced_rows, replaced_size = self._count(list(rows))
+                self._connection.executemany(
+                    'INSERT OR REPLACE INTO amv (id, timestamp, format, author, genre, rating, data, size, accessed) '
+                    'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', list(rows.values()))
+                self._add_to_totals(len(rows) - replaced_rows, sum(row[7] for row in rows.values()) - replaced_size)
+                self._evict()
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def delete_many(self, amv_ids):
+        """
+        Delete metadata of several AMV.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        """
+        amv_ids = list(set(amv_ids))
+        if not amv_ids:
+            return
+
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                deleted_rows, deleted_size = self._count(amv_ids)
+                self._connection.executemany('DELETE FROM amv WHERE id = ?', [(amv_id,) for amv_id in amv_ids])
+                self._add_to_totals(-deleted_rows, -deleted_size)
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+
+    def get_expired_ids(self, expired_since, limit):
+        """
+        Find AMV which metadata has expired, metadata obtained the longest time ago goes first.
+
+        :param float expired_since: Metadata obtained before this time is expired (seconds since epoch).
+        :param int limit: Maximal number of AMV.
+        :return: Identifiers of AMV.
+        :rtype: list[int]
+        """
+        with self._lock:
+            return [row[0] for row in self._connection.execute(
+                'SELECT id FROM amv WHERE timestamp < ? ORDER BY timestamp LIMIT ?', (expired_since, limit))]
+
+    def get_stored_ids(self, amv_ids):
+        """
+        Check which AMV are stored without reading their metadata and marking them as recently used.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: Identifiers of stored AMV.
+        :rtype: set[int]
+        """
+        amv_ids = list(set(amv_ids))
+        result = set()
+        with self._lock:
+            # SQLite limits number of query parameters
+            for i in range(0, len(amv_ids), 500):
+                chunk = amv_ids[i:i + 500]
+                result.update(row[0] for row in self._connection.execute(
+                    'SELECT id FROM amv WHERE id IN ({})'.format(', '.join('?' * len(chunk))), chunk))
+        return result
+
+    def iter_all(self, batch_size=500):
+        """
+        Iterate over metadata of all stored AMV without marking them as recently used.
+
+        Metadata stored in older formats is migrated but isn't stored again.
+
+        :param int batch_size: Number of AMV read by a single query.
+        :return: Generator of lists of AMV metadata in order of identifiers.
+        :rtype: collections.Iterator[list[AmvInfo]]
+        """
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._connection.execute(
+                    'SELECT id, format, data FROM amv WHERE id > ? ORDER BY id LIMIT ?',
+                    (last_id, batch_size)).fetchall()
+            if not rows:
+                return
+            last_id = rows[-1][0]
+            amv_info_list = [deserialize(amv_id, format_version, data) for amv_id, format_version, data in rows]
+            yield [amv_info for amv_info in amv_info_list if amv_info is not None]
+
+    def get_listing(self, key, max_age):
+        """
+        Get entries of listing page.
+
+        :param str key: Key of listing page.
+        :param float max_age: Maximal age of listing page in seconds.
+        :return: Entries of listing page or None if it isn't stored or is outdated.
+        :rtype: list|None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT data FROM listings WHERE key = ? AND timestamp >= ?', (key, time.time() - max_age)).fetchone()
+        return pickle.loads(row[0]) if row else None
+
+    def put_listing(self, key, entries):
+        """
+        Store entries of listing page.
+
+        :param str key: Key of listing page.
+        :param list entries: Entries of listing page.
+        """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO listings (key, timestamp, data) VALUES (?, ?, ?)',
+                (key, time.time(), pickle.dumps(entries, pickle.HIGHEST_PROTOCOL)))
+
+    def delete_listings(self, key_prefix):
+        """
+        Delete all pages of listing.
+
+        :param str key_prefix: Common prefix of keys of listing pages.
+        """
+        with self._lock:
+            self._connection.execute('DELETE FROM listings WHERE substr(key, 1, ?) = ?', (len(key_prefix), key_prefix))
+
+    def _count(self, amv_ids):
+        """
+        Count stored AMV among specified ones and total size of their metadata.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: Number of stored AMV and total size of their metadata in bytes.
+        :rtype: tuple(int, int)
+        """
+        rows_count, total_size = 0, 0
+        # SQLite limits number of query parameters
+        for i in range(0, len(amv_ids), 500):
+            chunk = amv_ids[i:i + 500]
+            count, size = self._connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM amv WHERE id IN ({})'.format(', '.join('?' * len(chunk))),
+                chunk).fetchone()
+            rows_count += count
+            total_size += size
+        return rows_count, total_size
+
+    def _add_to_totals(self, rows_count, total_size):
+        """
+        Update number of stored AMV and total size of their metadata.
+
+        :param int rows_count: Change of number of stored AMV.
+        :param int total_size: Change of total size of metadata in bytes.
+        """
+        self._connection.execute(
+            'UPDATE amv_totals SET row_count = row_count + ?, total_size = total_size + ? WHERE id = 0',
+            (rows_count, total_size))
+
+    def _evict(self):
+        """
+        Remove least recently used AMV once the limits are exceeded.
+
+        AMV are removed until `EVICTION_LOW_WATER` of the limits is left, so the next writes don't evict again.
+        """
+        rows_count, total_size = self._connection.execute('SELECT row_count, total_size FROM amv_totals').fetchone()
+        if rows_count <= self.max_rows and total_size <= self.max_size:
+            return
+
+        max_rows, max_size = int(self.max_rows * EVICTION_LOW_WATER), int(self.max_size * EVICTION_LOW_WATER)
+        evicted_rows = []
+        evicted_size = 0
+        cursor = self._connection.execute('SELECT id, size FROM amv ORDER BY accessed')
+        for amv_id, size in cursor:
+            if rows_count - len(evicted_rows) <= max_rows and total_size - evicted_size <= max_size:
+                break
+            evicted_rows.append((amv_id,))
+            evicted_size += size
+        cursor.close()
+        self._connection.executemany('DELETE FROM amv WHERE id = ?', evicted_rows)
+        self._add_to_totals(-len(evicted_rows), -evicted_size)
+
+
+class TaskQueue(object):
+    """
+    Persistent queue of background tasks shared by plugin invocations and the service.
+
+    Task is identified by its kind and key, so the same task queued several times is executed once with the highest
+    of requested priorities.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the queue database.
+        """
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS tasks (
+                kind TEXT NOT NULL,
+                key TEXT NOT NULL,
+                priority INTEGER NOT NULL,
+                created REAL NOT NULL,
+                PRIMARY KEY (kind, key)
+            );
+            CREATE INDEX IF NOT EXISTS tasks_order ON tasks (kind, priority DESC, created);
+        ''')
+
+    def put(self, kind, keys, priority):
+        """
+        Queue tasks.
+
+        :param str kind: Kind of tasks.
+        :param list keys: Keys of tasks.
+        :param int priority: Priority of tasks.
+        """
+        rows = [(kind, str(key), priority) for key in keys]
+        if not rows:
+            return
+
+        now = time.time()
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO tasks (kind, key, priority, created) VALUES (?, ?, ?, ?)',
+                [row + (now,) for row in rows])
+            self._connection.executemany(
+                'UPDATE tasks SET priority = ? WHERE kind = ? AND key = ? AND priority < ?',
+                [(priority, kind, key, priority) for kind, key, priority in rows])
+            self._connection.execute('COMMIT')
+
+    def pop(self, kind, limit, min_priority=PRIORITY_BACKGROUND):
+        """
+        Take tasks with the highest priority out of the queue.
+
+        :param str kind: Kind of tasks.
+        :param int limit: Maximal number of tasks.
+        :param int min_priority: Minimal priority of tasks.
+        :return: Keys of tasks.
+        :rtype: list[str]
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            keys = [row[0] for row in self._connection.execute(
+                'SELECT key FROM tasks WHERE kind = ? AND priority >= ? ORDER BY priority DESC, created LIMIT ?',
+                (kind, min_priority, limit))]
+            self._connection.executemany('DELETE FROM tasks WHERE kind = ? AND key = ?', [(kind, key) for key in keys])
+            self._connection.execute('COMMIT')
+        return keys
+
+    def has_tasks(self, kind):
+        """
+        Check whether there are queued tasks of specified kind.
+
+        :param str kind: Kind of tasks.
+        :rtype: bool
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT 1 FROM tasks WHERE kind = ? LIMIT 1', (kind,)).fetchone()
+        return row is not None
+
+    def cancel(self, kind):
+        """
+        Remove all queued tasks of specified kind.
+
+        :param str kind: Kind of tasks.
+        """
+        with self._lock:
+            self._connection.execute('DELETE FROM tasks WHERE kind = ?', (kind,))
+
+
+class SyncStore(object):
+    """
+    Persistent state of AMV lists synchronized with the download folder.
+
+    For every synchronized list (e.g. favourites of a user) the store keeps identifiers of AMV which have been
+    downloaded, AMV which have been removed from the list but not reported to the user yet and AMV which have failed
+    to be downloaded and are pending to be downloaded next time.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the state database.
+        """
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS synced (
+                scope TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                timestamp REAL NOT NULL,
+                removed INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (scope, id)
+            );
+            CREATE TABLE IF NOT EXISTS pending (
+                scope TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                PRIMARY KEY (scope, id)
+            );
+        ''')
+
+    def get_synced_ids(self, scope):
+        """
+        Get identifiers of synchronized AMV.
+
+        :param str scope: Synchronized list.
+        :return: Identifiers of AMV.
+        :rtype: set[int]
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT id FROM synced WHERE scope = ? AND removed = 0', (scope,))
+            return {row[0] for row in rows}
+
+    def get_pending_ids(self, scope):
+        """
+        Get identifiers of AMV which have failed to be downloaded.
+
+        :param str scope: Synchronized list.
+        :return: Identifiers of AMV.
+        :rtype: set[int]
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT id FROM pending WHERE scope = ?', (scope,))
+            return {row[0] for row in rows}
+
+    def put_synced(self, scope, amv_ids):
+        """
+        Mark AMV as synchronized.
+
+        :param str scope: Synchronized list.
+        :param collections.Iterable[int] amv_ids: Identifiers of AMV.
+        """
+        now = time.time()
+        amv_ids = list(amv_ids)
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._connection.executemany(
+                'INSERT OR REPLACE INTO synced (scope, id, timestamp, removed) VALUES (?, ?, ?, 0)',
+                [(scope, amv_id, now) for amv_id in amv_ids])
+            self._connection.executemany(
+                'DELETE FROM pending WHERE scope = ? AND id = ?', [(scope, amv_id) for amv_id in amv_ids])
+            self._connection.execute('COMMIT')
+
+    def put_pending(self, scope, amv_ids):
+        """
+        Mark AMV as pending to be downloaded by the next synchronization.
+
+        :param str scope: Synchronized list.
+        :param collections.Iterable[int] amv_ids: Identifiers of AMV.
+        """
+        with self._lock:
+            self._connection.executemany(
+                'INSERT OR IGNORE INTO pending (scope, id) VALUES (?, ?)', [(scope, amv_id) for amv_id in amv_ids])
+
+    def delete_pending(self, scope, amv_ids):
+        """
+        Forget AMV pending to be downloaded, e.g. because they have been removed from the list.
+
+        :param str scope: Synchronized list.
+        :param collections.Iterable[int] amv_ids: Identifiers of AMV.
+        """
+        with self._lock:
+            self._connection.executemany(
+                'DELETE FROM pending WHERE scope = ? AND id = ?', [(scope, amv_id) for amv_id in amv_ids])
+
+    def put_removed(self, scope, amv_ids):
+        """
+        Mark synchronized AMV as removed from the list, AMV pending to be downloaded are forgotten.
+
+        :param str scope: Synchronized list.
+        :param collections.Iterable[int] amv_ids: Identifiers of AMV.
+        """
+        rows = [(scope, amv_id) for amv_id in amv_ids]
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            self._connection.executemany('UPDATE synced SET removed = 1 WHERE scope = ? AND id = ?', rows)
+            self._connection.executemany('DELETE FROM pending WHERE scope = ? AND id = ?', rows)
+            self._connection.execute('COMMIT')
+
+    def pop_removed(self, scope):
+        """
+        Take identifiers of AMV removed from the list since the last call and forget them.
+
+        :param str scope: Synchronized list.
+        :return: Identifiers of AMV.
+        :rtype: list[int]
+        """
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            amv_ids = [row[0] for row in self._connection.execute(
+                'SELECT id FROM synced WHERE scope = ? AND removed = 1 ORDER BY id', (scope,))]
+            self._connection.execute('DELETE FROM synced WHERE scope = ? AND removed = 1', (scope,))
+            self._connection.execute('COMMIT')
+        return amv_ids
+
+
+class DownloadManifest(object):
+    """
+    Persistent list of AMV saved to the download folder with names, sizes and checksums of their files.
+
+    Identifiers of downloaded AMV are loaded once, so checks whether AMV is downloaded are answered from memory
+    without touching the database or the download folder.
+    """
+
+    def __init__(self, path, folder):
+        """
+        :param str path: Path to the manifest database.
+        :param str folder: Download folder described by the manifest.
+        """
+        self.folder = folder
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS folders (
+                folder TEXT PRIMARY KEY,
+                reconciled REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS downloads (
+                folder TEXT NOT NULL,
+                id INTEGER NOT NULL,
+                files TEXT NOT NULL,
+                timestamp REAL NOT NULL,
+                PRIMARY KEY (folder, id)
+            );
+        ''')
+        self.initialized = self._connection.execute(
+            'SELECT 1 FROM folders WHERE folder = ?', (folder,)).fetchone() is not None
+        self._amv_ids = {row[0] for row in self._connection.execute(
+            'SELECT id FROM downloads WHERE folder = ?', (folder,))}
+
+    def __contains__(self, amv_id):
+        return amv_id in self._amv_ids
+
+    def __len__(self):
+        return len(self._amv_ids)
+
+    def get_files(self, amv_id):
+        """
+        Get files of downloaded AMV.
+
+        :param int amv_id: Identifier of AMV.
+        :return: Names, sizes and checksums of files or None if AMV isn't downloaded.
+        :rtype: list[tuple(str, int|None, str|None)]|None
+        """
+        with self._lock:
+            row = self._connection.execute(
+                'SELECT files FROM downloads WHERE folder = ? AND id = ?', (self.folder, amv_id)).fetchone()
+        return [tuple(file_info) for file_info in json.loads(row[0])] if row else None
+
+    def get_downloads(self):
+        """
+        Get files of all downloaded AMV.
+
+        :return: Names, sizes and checksums of files by identifiers of AMV.
+        :rtype: dict[int, list[tuple(str, int|None, str|None)]]
+        """
+        with self._lock:
+            rows = self._connection.execute(
+                'SELECT id, files FROM downloads WHERE folder = ?', (self.folder,)).fetchall()
+        return {amv_id: [tuple(file_info) for file_info in json.loads(files)] for amv_id, files in rows}
+
+    def put(self, amv_id, files):
+        """
+        Mark AMV as downloaded.
+
+        :param int amv_id: Identifier of AMV.
+        :param list[tuple(str, int|None, str|None)] files: Names, sizes and checksums of files.
+        """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO downloads (folder, id, files, timestamp) VALUES (?, ?, ?, ?)',
+                (self.folder, amv_id, json.dumps([list(file_info) for file_info in files]), time.time()))
+            self._amv_ids.add(amv_id)
+
+    def replace(self, downloads):
+        """
+        Replace content of the manifest.
+
+        :param dict[int, list[tuple(str, int|None, str|None)]] downloads: Files of downloaded AMV by identifiers of AMV.
+        """
+        now = time.time()
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._connection.execute('DELETE FROM downloads WHERE folder = ?', (self.folder,))
+                self._connection.executemany(
+                    'INSERT INTO downloads (folder, id, files, timestamp) VALUES (?, ?, ?, ?)',
+                    [(self.folder, amv_id, json.dumps([list(file_info) for file_info in files]), now)
+                     for amv_id, files in downloads.items()])
+                self._connection.execute(
+                    'INSERT OR REPLACE INTO folders (folder, reconciled) VALUES (?, ?)', (self.folder, now))
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+            self._connection.execute('COMMIT')
+            self._amv_ids = set(downloads)
+            self.initialized = True
+
+
+class CrawlState(object):
+    """
+    Persistent progress of crawling of the site catalog.
+
+    Crawler walks identifiers of AMV upwards. The state keeps the first identifier which hasn't been walked yet, the
+    highest identifier of existing AMV and time until which crawling is postponed, so crawling interrupted by exit of
+    Kodi is resumed from the same place.
+    """
+
+    def __init__(self, path):
+        """
+        :param str path: Path to the state database.
+        """
+        self._lock = threading.Lock()
+        self._connection = open_database(path)
+        self._connection.executescript('''
+            CREATE TABLE IF NOT EXISTS crawl (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                next_id INTEGER NOT NULL,
+                newest_id INTEGER NOT NULL,
+                postponed_until REAL NOT NULL
+            );
+        ''')
+
+    def get(self):
+        """
+        Get progress of crawling.
+
+        :return: The first identifier to walk, the highest identifier of existing AMV and time until which crawling is
+            postponed (seconds since epoch).
+        :rtype: tuple(int, int, float)
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT next_id, newest_id, postponed_until FROM crawl').fetchone()
+        return tuple(row) if row else (1, 0, 0.0)
+
+    def put(self, next_id, newest_id, postponed_until=0.0):
+        """
+        Save progress of crawling.
+
+        :param int next_id: The first identifier to walk.
+        :param int newest_id: The highest identifier of existing AMV.
+        :param float postponed_until: Time until which crawling is postponed (seconds since epoch).
+        """
+        with self._lock:
+            self._connection.execute(
+                'INSERT OR REPLACE INTO crawl (id, next_id, newest_id, postponed_until) VALUES (0, ?, ?, ?)',
+                (next_id, newest_id, postponed_until))
+
+    def is_due(self):
+        """
+        Check whether crawling isn't postponed.
+
+        :rtype: bool
+        """
+        return self.get()[2] <= time.time()
@@ -0,0 +1,102 @@
+# coding=utf-8
+"""
+Synchronization of AMV listings with the download folder.
+"""
+from constants import PLUGIN
+
+__all__ = ['ListingSync']
+
+# Number of pending AMV retried by a single portion, it is the number of AMV on a listing page
+PENDING_PORTION_SIZE = 10
+
+
+class ListingSync(object):
+    """
+    Synchronization of evaluated or favourite AMV of the user with the download folder.
+
+    Full synchronization crawls the whole listing and detects AMV removed from it by the difference between AMV
+    synchronized before and crawled ones. New AMV appear at the beginning of the listing, so incremental
+    synchronization stops at the first page which consists of synchronized AMV only. Removals made by the plugin
+    are recorded by the browser, other removals are detected by full synchronizations only.
+
+    AMV which have failed to be downloaded or which metadata can't be obtained are kept pending. Incremental
+    synchronization retries them even if they are beyond the page where it stops.
+    """
+
+    def __init__(self, browser, listing, incremental):
+        """
+        :param AmvNewsBrowser browser: Browser to access AmvNews site.
+        :param str listing: Name of listing ('evaluated' or 'favourite').
+        :param bool incremental: Whether synchronization is incremental. Full synchronization is performed anyway if
+            nothing has been synchronized yet.
+        """
+        self.browser = browser
+        self.listing = listing
+        self.scope = browser.get_listing_scope(listing)
+        self._synced_ids = browser.sync_store.get_synced_ids(self.scope)
+        self._pending_ids = browser.sync_store.get_pending_ids(self.scope)
+        self.incremental = incremental and bool(self._synced_ids)
+        self._crawled_ids = set()
+        self._queued_ids = set()
+        self._failed_ids = set()
+        self._complete = False
+
+    def iter_amv_pages(self):
+        """
+        Iterate over pages of AMV to be downloaded.
+
+        Incremental synchronization yields AMV which haven't been synchronized yet only, pending AMV which haven't
+        been crawled are yielded after the crawled pages.
+
+        :return: Generator of lists of AMV metadata.
+        :rtype: collections.Iterator[list[AmvInfo]]
+        """
+        for amv_ids in self.browser.iter_amv_id_pages(self.listing):
+            self._crawled_ids.update(amv_ids)
+            if self.incremental:
+                amv_ids = [amv_id for amv_id in amv_ids if amv_id not in self._synced_ids]
+                if not amv_ids:
+                    PLUGIN.log.info('Synchronization of %s stopped at already synchronized page', self.scope)
+                    break
+            yield self._get_amv_list(amv_ids)
+        else:
+            # Pending AMV which haven't been crawled are removed from the listing
+            self._complete = True
+            return
+
+        pending_ids = sorted(self._pending_ids - self._crawled_ids, reverse=True)
+        for i in range(0, len(pending_ids), PENDING_PORTION_SIZE):
+            yield self._get_amv_list(pending_ids[i:i + PENDING_PORTION_SIZE])
+
+    def commit(self, failed_ids):
+        """
+        Save state of synchronization once yielded AMV are downloaded.
+
+        AMV which haven't been downloaded are kept pending to be downloaded next time.
+
+        :param collections.Iterable[int] failed_ids: Identifiers of AMV which haven't been downloaded.
+        :return: Identifiers of AMV removed from the listing since the previous synchronization.
+        :rtype: list[int]
+        """
+        failed_ids = self._failed_ids.union(failed_ids)
+        sync_store = self.browser.sync_store
+        sync_store.put_synced(self.scope, self._queued_ids - failed_ids)
+        sync_store.put_pending(self.scope, failed_ids)
+        if self._complete:
+            sync_store.put_removed(self.scope, self._synced_ids - self._crawled_ids)
+            sync_store.delete_pending(self.scope, self._pending_ids - self._crawled_ids)
+        return sync_store.pop_removed(self.scope)
+
+    def _get_amv_list(self, amv_ids):
+        """
+        Get metadata of AMV to be downloaded, AMV which metadata can't be obtained are recorded as failed.
+
+        :param list[int] amv_ids: Identifiers of AMV.
+        :return: List of AMV metadata.
+        :rtype: list[AmvInfo]
+        """
+        amv_list = self.browser.get_amv_list(amv_ids)
+        found_ids = {amv_info.id for amv_info in amv_list}
+        self._queued_ids.update(found_ids)
+        self._failed_ids.update(set(amv_ids) - found_ids)
+        return amv_list
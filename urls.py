@@ -0,0 +1,66 @@
+# coding=utf-8
+"""
+URLs of https://amvnews.ru.
+
+The module is kept free of heavy dependencies, so routes which only build URLs (e.g. playing of AMV) don't load
+HTTP and HTML parsing libraries.
+"""
+import urllib.parse
+
+__all__ = ['get_homepage', 'get_page_url', 'get_absolute_url', 'get_amv_url', 'get_subtitles_url']
+
+# AmvNews site
+SITE_URL = 'https://amvnews.ru'
+
+
+def get_homepage():
+    """
+    Get URL of the site script which serves all pages.
+
+    :rtype: str
+    """
+    return '{}/index.php'.format(SITE_URL)
+
+
+def get_page_url(url_params):
+    """
+    Get full URL to query the site with specified URL params.
+
+    :param dict url_params: URL params.
+    :return: Full URL.
+    :rtype: str
+    """
+    return '{}?{}'.format(get_homepage(), urllib.parse.urlencode(url_params))
+
+
+def get_absolute_url(path):
+    """
+    Get absolute URL of the resource referenced by a page of the site.
+
+    :param str path: Path to the resource or its absolute URL.
+    :return: Absolute URL.
+    :rtype: str
+    """
+    return urllib.parse.urljoin(SITE_URL, path)
+
+
+def get_amv_url(amv_id):
+    """
+    Get URL to AMV file.
+
+    :param int amv_id: Identifier of AMV
+    :return: URL to AMV file.
+    :rtype: str
+    """
+    return get_page_url({'go': 'Files', 'file': 'down', 'id': amv_id})
+
+
+def get_subtitles_url(subtitles_id):
+    """
+    Get URL to subtitles file.
+
+    :param int subtitles_id: Identifier of subtitles
+    :return: URL to subtitles file.
+    :rtype: str
+    """
+    return get_page_url({'go': 'Files', 'file': 'down', 'sub': subtitles_id})